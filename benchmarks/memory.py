@@ -0,0 +1,76 @@
+"""Memory used by a large Conf, e.g. `python benchmarks/memory.py --sections 12500`.
+
+Writes a conf with `sections` generated sections of 10 keys each (so 10 * sections keys) to a
+temporary conf_dir, and reports the memory (traced with tracemalloc) retained by Conf.__init__,
+by which files it was allocated in, and the cost of copying the conf with to_dict.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from confr.models import Conf  # noqa: E402
+from confr.utils import copy_tree  # noqa: E402
+
+
+def generate(sections):
+    return {"classes": {
+        f"class_{i:05d}": {
+            "weight": 1.0,
+            "threshold": 0.5,
+            "enabled": True,
+            "name": f"c{i}",
+            "anchors": [1, 2, 3],
+            "loss": {"type": "focal", "gamma": 2.0, "alpha": 0.25},
+        }
+        for i in range(sections)
+    }}
+
+
+def traced(fn):
+    """(fn(), seconds, MB retained, MB peak)"""
+    gc.collect()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    ret = fn()
+    duration = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    return ret, duration, (current - before) / 1e6, (peak - before) / 1e6
+
+
+def main(sections, top):
+    with TemporaryDirectory() as conf_dir:
+        with open(os.path.join(conf_dir, "_base.json"), "w") as f:
+            json.dump(generate(sections), f) # JSON rather than YAML, so that parsing is quick
+
+        tracemalloc.start()
+        conf, duration, retained, peak = traced(lambda: Conf(
+            conf_dir=conf_dir, verbose=False, cli_overrides=False, env_overrides=False))
+        print(f"init: {len(conf.c_index)} keys in {duration:.2f}s, retained {retained:.1f} MB "
+              f"({retained * 1e6 / len(conf.c_index):.0f} B/key), peak {peak:.1f} MB")
+
+        snapshot = tracemalloc.take_snapshot()
+        for stat in snapshot.statistics("filename")[:top]:
+            print(f"  {stat.size / 1e6:6.1f} MB  {stat.traceback[0].filename}")
+
+        tree = conf.c_original
+        for name, fn in [("deepcopy", deepcopy), ("copy_tree", copy_tree)]:
+            _, duration, retained, peak = traced(lambda: fn(tree))
+            print(f"{name}: {duration:.2f}s, retained {retained:.1f} MB, peak {peak:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=10000)
+    parser.add_argument("--top", type=int, default=8, help="number of files to list allocations of")
+    args = parser.parse_args()
+    main(args.sections, args.top)
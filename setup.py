@@ -24,7 +24,7 @@ setuptools.setup(
     packages=setuptools.find_packages(where="src"),
     python_requires=">=3.6",
     install_requires=[
-        "aiocontextvars>=0.2.2",
+        "aiocontextvars>=0.2.2; python_version < '3.7'",
         "pyyaml",
     ],
     extras_require={
@@ -1,2 +1,7 @@
-from . import plx
+import time
+_import_start = time.perf_counter()
+
+from . import plx, profiling
 from .interface import *
+
+profiling.import_time = time.perf_counter() - _import_start
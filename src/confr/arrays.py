@@ -0,0 +1,78 @@
+"""Typed numeric arrays, declared in types files as `array[<dtype>]`, e.g. `weights: array[float32]`.
+
+Values of keys with an array type are stored as `array.array`s rather than lists of Python
+numbers (4 bytes per float32 instead of a pointer to a float object), and `confr.get` and bound
+functions receive read-only memoryviews of them, without copying. NumPy can wrap such a view
+without copying it either (`np.asarray(view)`). Arrays are written back as plain lists.
+"""
+import array
+
+from confr import settings
+
+
+DTYPES = {
+    "int8": "b", "uint8": "B", "int16": "h", "uint16": "H",
+    "int32": "i", "uint32": "I", "int64": "q", "uint64": "Q",
+    "float32": "f", "float64": "d",
+}
+TYPECODES = {typecode: dtype for dtype, typecode in DTYPES.items()}
+
+
+class ArrayType:
+    """The type `array[dtype]`. Calling it converts a list (or a string such as "[1, 2]" or
+    "1,2", e.g. a CLI arg) to an array."""
+
+    __slots__ = ("dtype", "typecode")
+
+    def __init__(self, dtype):
+        assert dtype in DTYPES, f"Unknown array dtype {dtype}, expected one of {list(DTYPES)}."
+        self.dtype = dtype
+        self.typecode = DTYPES[dtype]
+
+    @property
+    def __name__(self):
+        return f"array[{self.dtype}]"
+
+    def __repr__(self):
+        return self.__name__
+
+    def __eq__(self, other):
+        return type(other) == ArrayType and other.dtype == self.dtype
+
+    def __hash__(self):
+        return hash(self.__name__)
+
+    def __call__(self, v):
+        if type(v) == str:
+            parse = float if self.typecode in "fd" else int
+            v = [parse(x) for x in v.strip().strip("[]").split(",") if x.strip()]
+        elif type(v) == array.array and v.typecode == self.typecode:
+            return v
+        return array.array(self.typecode, v)
+
+    def check(self, v):
+        return type(v) == array.array and v.typecode == self.typecode
+
+
+def parse_type(name):
+    """The type called `name`, i.e. a primitive type (see settings.STR_TO_TYPE) or array[dtype]."""
+    if name in settings.STR_TO_TYPE:
+        return settings.STR_TO_TYPE[name]
+    if name.startswith("array[") and name.endswith("]"):
+        return ArrayType(name[len("array["):-1])
+    raise KeyError(f"Unknown type {name}.")
+
+
+def type_of(v):
+    """type(v), or its ArrayType if `v` is an array."""
+    if type(v) == array.array:
+        return ArrayType(TYPECODES[v.typecode])
+    return type(v)
+
+
+def view(arr):
+    """Read-only view of `arr`, sharing its memory (on Python < 3.8, a view of a copy)."""
+    mv = memoryview(arr)
+    if hasattr(mv, "toreadonly"):
+        return mv.toreadonly()
+    return memoryview(arr.tobytes()).cast(arr.typecode) # bytes are immutable, so the view is read-only
@@ -0,0 +1,49 @@
+"""Key-level differences between confs, which can be applied to a live conf (see Conf.apply_diff)."""
+import os
+from collections import namedtuple
+
+from confr.models import Conf
+
+
+Change = namedtuple("Change", ["key", "kind", "old", "new"]) # kind is "added", "removed" or "changed"
+
+
+def diff(conf_a, conf_b):
+    """List of Changes (one per leaf) which turn `conf_a` into `conf_b`.
+
+    Both can be Conf objects, conf dicts, conf dirs (with a _base conf file), conf files (in any
+    of the formats in confr.formats) or compiled conf files. Values are compared as they're written in the conf, i.e. without resolving
+    interpolations or creating singletons.
+    """
+    items_a = dict(_as_conf(conf_a).flattened_items())
+    items_b = dict(_as_conf(conf_b).flattened_items())
+
+    changes = []
+    for k, v in items_b.items():
+        if k not in items_a:
+            changes.append(Change(k, "added", None, v))
+        elif items_a[k] != v or type(items_a[k]) != type(v):
+            changes.append(Change(k, "changed", items_a[k], v))
+    for k, v in items_a.items():
+        if k not in items_b:
+            changes.append(Change(k, "removed", v, None))
+    return changes
+
+
+def _as_conf(conf):
+    if isinstance(conf, Conf):
+        return conf
+    kwargs = dict(verbose=False, cli_overrides=False, env_overrides=False)
+    if type(conf) == dict:
+        return Conf(conf=conf, **kwargs)
+    if os.path.isdir(conf):
+        return Conf(conf_dir=conf, **kwargs)
+
+    from confr.compiled import is_binary
+    from confr import formats
+    if is_binary(conf):
+        return Conf(compiled=conf, **kwargs)
+    conf_dict = formats.load(conf, verbose=False) or {}
+    if "_compiled" in conf_dict:
+        return Conf(compiled=conf, **kwargs)
+    return Conf(conf=conf_dict, conf_dir=os.path.dirname(conf), **kwargs)
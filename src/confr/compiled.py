@@ -0,0 +1,244 @@
+"""Compiled configs: fully merged confs with interpolations resolved, plus content hashes.
+
+A compiled conf file contains two top-level keys:
+
+    _compiled:
+        version: 1
+        fingerprint: <hash of the whole conf>
+        fingerprints: {<dotted key>: <hash>} # for every leaf and every singleton
+        types: {<dotted key>: <type name>}
+    conf: {...}
+
+Loading it with `Conf(compiled=fp)` skips following `_file` references and type inference.
+
+Compiled confs can also be written in a binary format (`write_compiled(..., binary=True)`):
+
+    BINARY_MAGIC | header length (uint64) | header | values
+
+where header is a marshalled dict with the `_compiled` metadata, the marshal and Python versions
+which wrote it, and an offset table of the values of every top-level key. Binary files are
+memory-mapped, and each top-level value is only decoded once it's accessed (see `BinaryCompiled`),
+so processes sharing a compiled conf share its pages in the OS page cache. Since marshal's format
+can change between Python versions, binary confs can only be read by the Python version (major
+and minor) which wrote them, and like pickles they should only be read from trusted sources.
+"""
+import json
+import mmap
+import array
+import sys
+import struct
+import marshal
+import hashlib
+
+from confr import log
+from confr.index import KeyIndex
+from confr.arrays import parse_type, type_of
+from confr.utils import read_yaml, write_yaml, atomic_open
+
+
+VERSION = 1
+BINARY_MAGIC = b"CONFRBIN"
+_HEADER_LEN = struct.Struct("<Q")
+
+
+def fingerprint(value):
+    """Stable content hash of a (resolved) conf value."""
+    serialized = json.dumps(value, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+def compile_conf(conf, except_keys=()):
+    """Returns the compiled representation (see module docstring) of the active conf."""
+    from confr.models import _is_interpolation_val, _interpolated_key
+
+    conf._materialize()
+    if conf.overrides_dicts.get():
+        tree = conf.to_dict()
+        index = KeyIndex(tree)
+    else:
+        tree, index = conf.c_original, conf.c_index
+    except_keys = frozenset(except_keys)
+
+    def resolve(k, v, seen):
+        if _is_interpolation_val(v):
+            target = _interpolated_key(k, v)
+            if target is None or target in seen or target not in index:
+                return v
+            resolved = resolve(target, index.get(target), seen | {target})
+            # keep references to singletons as they are, rather than creating copies of them
+            return v if _contains_reference(resolved) else resolved
+        elif type(v) == dict:
+            return {
+                k2: v2 if k2 == "_callable" else resolve(f"{k}.{k2}", v2, seen)
+                for k2, v2 in v.items()
+            }
+        else:
+            return v
+
+    def compile_dict(d, prefix):
+        ret = {}
+        for k, v in d.items():
+            k_with_prefix = f"{prefix}.{k}" if prefix else k
+            if k_with_prefix in except_keys:
+                continue
+            if type(v) == dict and "_callable" not in v:
+                ret[k] = compile_dict(v, k_with_prefix)
+            else:
+                ret[k] = resolve(k_with_prefix, v, frozenset([k_with_prefix]))
+        return ret
+
+    compiled = compile_dict(tree, None)
+
+    fingerprints, types = {}, {}
+    stack = [(None, compiled)]
+    while stack:
+        prefix, d = stack.pop()
+        for k, v in d.items():
+            k_with_prefix = f"{prefix}.{k}" if prefix else k
+            if type(v) == dict and "_callable" in v:
+                # a singleton is identified by its callable and its (resolved) arguments
+                fingerprints[k_with_prefix] = fingerprint(v)
+            if type(v) == dict:
+                stack.append((k_with_prefix, v))
+            else:
+                types[k_with_prefix] = type_of(v).__name__
+                if type(v) == array.array:
+                    d[k] = v = v.tolist()
+                fingerprints[k_with_prefix] = fingerprint(v)
+
+    fingerprints = dict(sorted(fingerprints.items()))
+    return {
+        "_compiled": {
+            "version": VERSION,
+            "fingerprint": fingerprint(fingerprints),
+            "fingerprints": fingerprints,
+            "types": dict(sorted(types.items())),
+        },
+        "conf": compiled,
+    }
+
+
+def write_compiled(fp, conf, except_keys=(), verbose=True, binary=False):
+    compiled = compile_conf(conf, except_keys=except_keys)
+    if binary:
+        write_binary(fp, compiled, verbose=verbose)
+    else:
+        write_yaml(fp, compiled, verbose=verbose)
+    return compiled
+
+
+def write_binary(fp, compiled, verbose=True):
+    if verbose:
+        log.info("Writing %s.", fp)
+    log.event("write", fp=fp)
+    values, offsets, offset = [], {}, 0
+    for k, v in compiled["conf"].items():
+        value = marshal.dumps(v)
+        offsets[k] = (offset, len(value))
+        offset += len(value)
+        values.append(value)
+    header = marshal.dumps({
+        **compiled["_compiled"],
+        "marshal_version": marshal.version,
+        "python": list(sys.version_info[:2]),
+        "offsets": offsets,
+    })
+
+    with atomic_open(fp, 'wb') as f:
+        f.write(BINARY_MAGIC)
+        f.write(_HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for value in values:
+            f.write(value)
+
+
+def is_binary(fp):
+    with open(fp, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+class BinaryCompiled:
+    """Memory-mapped binary compiled conf, whose top-level values are decoded on demand."""
+
+    def __init__(self, fp, verbose=True):
+        if verbose:
+            log.info("Reading %s.", fp)
+        with open(fp, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        log.event("load", fp=fp)
+        assert self.mm[:len(BINARY_MAGIC)] == BINARY_MAGIC, f"{fp} is not a binary compiled conf."
+        header_start = len(BINARY_MAGIC) + _HEADER_LEN.size
+        header_len, = _HEADER_LEN.unpack_from(self.mm, len(BINARY_MAGIC))
+        try:
+            self.header = marshal.loads(self.mm[header_start:header_start + header_len])
+        except (ValueError, EOFError, TypeError):
+            raise Exception(f"Can't decode {fp}, it was probably written by another Python version.")
+        written_by = (self.header.pop("marshal_version", None), self.header.pop("python", None))
+        if written_by != (marshal.version, list(sys.version_info[:2])):
+            raise Exception(
+                f"{fp} was written with marshal version {written_by[0]} by Python {written_by[1]}, "
+                f"can't read it with marshal version {marshal.version} (Python {list(sys.version_info[:2])}). "
+                "Write it again with this Python version, or use a yaml compiled conf.")
+        assert self.header["version"] == VERSION, \
+            f"Unsupported compiled conf version {self.header['version']} in {fp}."
+        self.offsets = self.header.pop("offsets")
+        self.values_start = header_start + header_len
+
+    def keys(self):
+        return self.offsets.keys()
+
+    def load(self, k):
+        offset, length = self.offsets[k]
+        start = self.values_start + offset
+        return marshal.loads(self.mm[start:start + length])
+
+    def to_compiled(self):
+        """The same dict as `read_compiled` returns for a yaml compiled conf (decodes everything)."""
+        return {"_compiled": self.header, "conf": {k: self.load(k) for k in self.keys()}}
+
+
+def read_compiled(fp, verbose=True, verify=False):
+    if is_binary(fp):
+        compiled = BinaryCompiled(fp, verbose=verbose).to_compiled()
+    else:
+        compiled = read_yaml(fp, verbose=verbose)
+    assert type(compiled) == dict and "_compiled" in compiled, f"{fp} is not a compiled conf."
+    assert compiled["_compiled"]["version"] == VERSION, \
+        f"Unsupported compiled conf version {compiled['_compiled']['version']} in {fp}."
+    if verify:
+        verify_compiled(compiled)
+    return compiled
+
+
+def verify_compiled(compiled):
+    """Raises if the values in a compiled conf don't match their fingerprints."""
+    index = KeyIndex(compiled["conf"])
+    fingerprints = compiled["_compiled"]["fingerprints"]
+    for k, expected in fingerprints.items():
+        assert k in index and fingerprint(index.get(k)) == expected, \
+            f"Fingerprint mismatch for {k}."
+    assert fingerprint(fingerprints) == compiled["_compiled"]["fingerprint"], \
+        "Fingerprint mismatch for the compiled conf."
+
+
+def compiled_types(metadata):
+    """Nested types dict (like Conf.types) from the flat type names in `_compiled` metadata."""
+    types = {}
+    for k, type_name in metadata["types"].items():
+        parts = k.split(".")
+        d = types
+        for part in parts[:-1]:
+            d = d.setdefault(part, {})
+        d[parts[-1]] = parse_type(type_name)
+    return types
+
+
+def _contains_reference(v):
+    if type(v) == str:
+        return v.startswith("@")
+    elif type(v) == dict:
+        return "_callable" in v or any(_contains_reference(v2) for v2 in v.values())
+    elif type(v) == list:
+        return any(_contains_reference(v2) for v2 in v)
+    else:
+        return False
@@ -0,0 +1,131 @@
+"""Conf file formats, by file extension.
+
+YAML (.yaml, .yml), JSON (.json, parsed with orjson if it's installed), TOML (.toml), pickle
+(.pkl, .pickle) and Python (.py) files can be used wherever a conf file is expected: as conf
+files, conf patches, `_file` references and types files. Python conf files are executed as
+modules (so Python caches their bytecode) and contribute their `conf` dict, or if they don't
+define one, their public variables. Pickle and Python conf files run code when they're loaded,
+so only use them for confs you trust (e.g. machine-written ones).
+
+Names without a known extension (e.g. `{"_file": "model"}` or conf patches) resolve to the first
+existing file among the YAML, JSON and TOML extensions (see resolved_exts), trying .yaml first.
+Pickle and Python files are only loaded when named with their extension, and never from URLs.
+"""
+from confr import log, sources
+from confr.utils import load_yaml
+
+
+def load_json(fp):
+    with sources.open_location(fp, "rb") as f:
+        data = f.read()
+    try:
+        import orjson
+    except ImportError:
+        import json
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def load_toml(fp):
+    try:
+        import tomllib
+    except ImportError: # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise Exception(f"Reading {fp} requires Python 3.11+ or the tomli package.")
+    with sources.open_location(fp, "rb") as f:
+        return tomllib.load(f)
+
+
+def load_pickle(fp):
+    assert not sources.is_url(fp), f"Can't load pickled conf {fp} from a URL, only local files."
+    import pickle
+    with sources.open_location(fp, "rb") as f:
+        return pickle.load(f)
+
+
+def load_py(fp):
+    assert not sources.is_url(fp), f"Can't load Python conf {fp} from a URL, only local files."
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location("_confr_conf", fp)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if isinstance(getattr(module, "conf", None), dict):
+        return module.conf
+    return {
+        k: v for k, v in vars(module).items()
+        if not k.startswith("_") and not callable(v) and type(v).__name__ != "module"
+    }
+
+
+formats = { # extension -> fn loading a file of that format
+    "yaml": load_yaml,
+    "yml": load_yaml,
+    "json": load_json,
+    "toml": load_toml,
+    "pkl": load_pickle,
+    "pickle": load_pickle,
+    "py": load_py,
+}
+# extensions tried (in this order) for names without one; formats which execute code when they're
+# loaded are only used when named explicitly
+resolved_exts = ["yaml", "yml", "json", "toml"]
+
+
+def register_format(ext, load, resolve=True):
+    """Loads files ending with `.{ext}` with `load(fp)`, which returns the conf dict. With
+    resolve=True, names without an extension may also resolve to `.{ext}` files."""
+    formats[ext] = load
+    if resolve and ext not in resolved_exts:
+        resolved_exts.append(ext)
+
+
+def split_ext(fp):
+    """(fp without its extension, extension), or (fp, None) if it has no known extension."""
+    stem, dot, ext = fp.rpartition(".")
+    if dot and "/" not in ext and ext in formats:
+        return stem, ext
+    return fp, None
+
+
+def load(fp, verbose=True):
+    """Contents of the conf file `fp`, parsed according to its extension (YAML by default)."""
+    if verbose:
+        log.info("Reading %s.", fp)
+    ret = read(fp)
+    log.event("load", fp=fp)
+    return ret
+
+
+def read(fp):
+    """Like load, but without logging (e.g. for reading in a background thread)."""
+    return formats[split_ext(fp)[1] or "yaml"](fp)
+
+
+def resolve(fp):
+    """`fp`, with the extension of the first format whose file exists if it has none."""
+    if split_ext(fp)[1] is not None:
+        return fp
+    for ext in resolved_exts:
+        if sources.exists(f"{fp}.{ext}"):
+            return f"{fp}.{ext}"
+    if "." in fp.rsplit("/", 1)[-1]:
+        return fp # e.g. a YAML file with another extension
+    return f"{fp}.yaml" # doesn't exist, reported when it's read
+
+
+def types_fps(conf_fp):
+    """Where the types of `conf_fp` may be defined: {name}_types with its extension, or .yaml."""
+    stem, ext = split_ext(conf_fp)
+    if ext is None:
+        return []
+    return [f"{stem}_types.{ext2}" for ext2 in dict.fromkeys([ext, "yaml"])]
+
+
+def types_fp(conf_fp):
+    """The types file of `conf_fp` (e.g. model_types.yaml for model.json), or None."""
+    for fp in types_fps(conf_fp):
+        if sources.exists(fp):
+            return fp
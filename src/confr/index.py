@@ -0,0 +1,190 @@
+from confr.utils import copy_tree
+
+
+class KeyIndex:
+    """Flat `dotted_key -> (parent_dict, leaf_key)` index over a nested conf dict.
+
+    Both inner (dict) nodes and leaves are indexed. Mutations of the indexed dict need to be
+    mirrored with `discard` (before the old value is replaced) and `add` (after the new value
+    is in place); see `models._set` and `models._deep_merge`.
+
+    Entries refer to the key objects of the indexed dicts rather than copies of them, and the
+    lookup by last key segment (used by `match`) is only built once it's first needed, since
+    its sets take about as much memory as the rest of the index.
+    """
+
+    def __init__(self, root=None):
+        self.root = {} if root is None else root
+        self.entries = {}
+        self.by_leaf = None # last key segment -> set of dotted keys ending with it, built by match
+        for k in self.root:
+            self.add(str(k), self.root, k)
+
+    def __contains__(self, k):
+        return k in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, k, default=None):
+        entry = self.entries.get(k)
+        if entry is None:
+            return default
+        parent, leaf = entry
+        return parent[leaf]
+
+    def add(self, k, parent, leaf):
+        """Indexes `parent[leaf]` (and everything below it) under the dotted key `k`."""
+        stack = [(k, parent, leaf)]
+        while stack:
+            k, parent, leaf = stack.pop()
+            self.entries[k] = (parent, leaf)
+            if self.by_leaf is not None:
+                self.by_leaf.setdefault(str(leaf), set()).add(k)
+            v = parent[leaf]
+            if type(v) == dict:
+                stack.extend((f"{k}.{k2}", v, k2) for k2 in v)
+
+    def discard(self, k):
+        """Removes `k` and all keys below it from the index."""
+        entry = self.entries.pop(k, None)
+        if entry is None:
+            return
+        stack = [(k, entry)]
+        while stack:
+            k, (parent, leaf) = stack.pop()
+            self._discard_leaf(k, leaf)
+            v = parent.get(leaf)
+            if type(v) == dict:
+                for k2 in v:
+                    k2_with_prefix = f"{k}.{k2}"
+                    child_entry = self.entries.pop(k2_with_prefix, None)
+                    if child_entry is not None:
+                        stack.append((k2_with_prefix, child_entry))
+
+    def _discard_leaf(self, k, leaf):
+        if self.by_leaf is None:
+            return
+        keys = self.by_leaf.get(str(leaf))
+        if keys is not None:
+            keys.discard(k)
+            if not keys:
+                del self.by_leaf[str(leaf)]
+
+    def keys(self, prefix=None):
+        """Yields all dotted keys (of dicts and leaves) under `prefix`, including `prefix`."""
+        return iter(self.entries) if prefix is None else self._subtree_keys(prefix)
+
+    def items(self, prefix=None):
+        """Yields (dotted_key, value) of all leaves (under `prefix`), like `utils.flattened_items`."""
+        keys = self.entries if prefix is None else self._subtree_keys(prefix)
+        for k in keys:
+            parent, leaf = self.entries[k]
+            v = parent[leaf]
+            if type(v) != dict:
+                yield k, v
+
+    def with_keys(self, limit_keys):
+        """Same as `utils.with_keys(root, limit_keys)`, without walking the whole tree (and with
+        arrays copied as lists, as in Conf.to_dict)."""
+        keys = [k for k in limit_keys if k in self.entries]
+        # if both a key and its subkey are requested, the key only contains the subkey
+        keys = [k for k in keys if not any(k2.startswith(f"{k}.") for k2 in keys)]
+
+        ret = {}
+        for k in keys:
+            parts = k.split(".")
+            d = ret
+            for i in range(1, len(parts)):
+                parent, leaf = self.entries[".".join(parts[:i])]
+                d = d.setdefault(leaf, {})
+            parent, leaf = self.entries[k]
+            d[leaf] = copy_tree(parent[leaf], arrays_as_lists=True)
+        return ret
+
+    def match(self, pattern):
+        """Yields the dotted keys matching a glob pattern.
+
+        `*` matches exactly one key segment (or part of it, e.g. `enc*`), `**` matches any
+        number of segments. E.g. `model.encoder.*`, `model.*.lr`, `**.learning_rate`.
+        The work done is proportional to the number of keys under the pattern's literal
+        prefix (or, for `**.<literal>` patterns, the number of keys with that last segment).
+        """
+        segments = pattern.split(".")
+        if "**" not in segments:
+            yield from self._match_segments(segments)
+            return
+
+        regex = _pattern_regex(segments)
+        if not _is_glob(segments[-1]):
+            if self.by_leaf is None:
+                self.by_leaf = {}
+                for k, (parent, leaf) in self.entries.items():
+                    self.by_leaf.setdefault(str(leaf), set()).add(k)
+            candidates = sorted(self.by_leaf.get(segments[-1], ()))
+        else:
+            prefix = []
+            for segment in segments:
+                if _is_glob(segment):
+                    break
+                prefix.append(segment)
+            candidates = self._subtree_keys(".".join(prefix))
+        for k in candidates:
+            if regex.fullmatch(k):
+                yield k
+
+    def _match_segments(self, segments):
+        frontier = [(None, self.root)]
+        for segment in segments:
+            regex = _pattern_regex([segment]) if _is_glob(segment) else None
+            next_frontier = []
+            for k, v in frontier:
+                if type(v) != dict:
+                    continue
+                if regex is not None:
+                    children = [k2 for k2 in v if regex.fullmatch(str(k2))]
+                elif segment in v:
+                    children = [segment]
+                else:
+                    children = []
+                for k2 in children:
+                    next_frontier.append((k2 if k is None else f"{k}.{k2}", v[k2]))
+            frontier = next_frontier
+        for k, _ in frontier:
+            yield k
+
+    def _subtree_keys(self, k):
+        if k:
+            if k not in self.entries:
+                return
+            stack = [(k, self.get(k))]
+        else:
+            stack = [(None, self.root)]
+        while stack:
+            k, v = stack.pop()
+            if k is not None:
+                yield k
+            if type(v) == dict:
+                stack.extend(
+                    (k2 if k is None else f"{k}.{k2}", v2)
+                    for k2, v2 in reversed(list(v.items()))
+                )
+
+
+def _is_glob(segment):
+    return "*" in segment or "?" in segment
+
+
+def _pattern_regex(segments):
+    import re
+
+    regex = ""
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == "**":
+            regex += r"[^.]+(?:\.[^.]+)*" if last else r"(?:[^.]+\.)*"
+        else:
+            regex += re.escape(segment).replace(r"\*", "[^.]*").replace(r"\?", "[^.]")
+            if not last:
+                regex += r"\."
+    return re.compile(regex)
@@ -1,8 +1,12 @@
-import inspect
-
-from confr import plx
-from confr.utils import write_yaml, strip_keys, with_keys, interpolate_key, flattened_items
-from confr.models import Conf, ModifiedConf, _get_cli_arg, _get
+import os
+import contextvars
+from types import FunctionType, ModuleType
+
+from confr import plx, log
+from confr.log import add_event_handler, remove_event_handler
+from confr.utils import write_yaml, interpolate_key, flattened_items, atomic_open
+from confr.models import Conf, ModifiedConf, DELETE, _get_cli_arg, _related
+from confr.changes import Change, diff
 from collections import namedtuple
 
 
@@ -18,6 +22,67 @@ def set(k, v):
     return global_conf.set(k, v)
 
 
+def update(updates, atomic=True, validate=None):
+    return global_conf.update(updates, atomic=atomic, validate=validate)
+
+
+def apply_diff(changes, atomic=True, validate=None):
+    return global_conf.apply_diff(changes, atomic=atomic, validate=validate)
+
+
+def release(k):
+    return global_conf.release(k)
+
+
+def singleton_memory():
+    return global_conf.singleton_memory()
+
+
+def generation(k=None):
+    return global_conf.generation_of(k)
+
+
+_subscriptions = [] # (keys, callback), kept across re-inits
+
+
+def on_change(keys, callback):
+    """Calls `callback(changed_keys)` once after each batch of changes affecting `keys` (a key or
+    a list of keys): confr.set, confr.update, entering or leaving confr.modified_conf, and
+    (re-)init. A key is affected by changes to itself, its parents and subkeys, and the keys it
+    interpolates. Returns a function which cancels the subscription."""
+    subscription = ([keys] if type(keys) == str else list(keys), callback)
+    _subscriptions.append(subscription)
+    return lambda: _subscriptions.remove(subscription)
+
+
+def _dispatch_changes(conf, changed):
+    if conf is not global_conf:
+        return
+    for keys, callback in list(_subscriptions):
+        deps = conf.raw_deps(keys)
+        affected = [k for k in changed if any(_related(k, dep) for dep in deps)]
+        if affected:
+            callback(affected)
+
+
+def _dispatch_swap(old_conf, new_conf):
+    """Notifies subscribers of the keys whose values differ between the confs."""
+    for keys, callback in list(_subscriptions):
+        deps = new_conf.raw_deps(keys)
+        if old_conf is not None:
+            deps |= old_conf.raw_deps(keys)
+        affected = sorted(
+            k for k in deps
+            if old_conf is None or old_conf.to_dict(limit_keys=[k]) != new_conf.to_dict(limit_keys=[k])
+        )
+        if affected:
+            callback(affected)
+
+
+def select(pattern, resolve=False):
+    return global_conf.select(pattern, resolve=resolve)
+
+
 def get_input(k, alias=None, default=None, **kwargs):
     if alias:
         cli_arg_alias = _get_cli_arg(f"-{alias}", **kwargs)
@@ -34,23 +99,34 @@ def get_input(k, alias=None, default=None, **kwargs):
         return default
 
 
+bound_callables = {} # "module.qualname" -> confr.bind-decorated function or class
+
+
 def bind(*args, subkeys=None):
     def decorator(orig):
-        if inspect.isfunction(orig):
+        binding = _Binding(orig, subkeys)
+        if isinstance(orig, FunctionType):
             def confr_wrapped_function(*args, **kwargs):
-                overrides = _get_call_overrides(orig, args, kwargs, subkeys)
-                return orig(*args, **kwargs, **overrides)
+                return orig(*args, **kwargs, **binding.overrides(args, kwargs))
 
             confr_wrapped_function.__name__ = orig.__name__
-            return confr_wrapped_function
+            confr_wrapped_function.__qualname__ = orig.__qualname__
+            confr_wrapped_function.__module__ = orig.__module__
+            confr_wrapped_function.__doc__ = orig.__doc__
+            confr_wrapped_function.__wrapped__ = orig
+            confr_wrapped_function._confr_subkeys = subkeys
+            confr_wrapped_function._confr_binding = binding
+            wrapped = confr_wrapped_function
         else:
             class ConfrWrappedClass(orig):
                 def __init__(self, *args, **kwargs):
-                    overrides = _get_call_overrides(orig, args, kwargs, subkeys)
-                    super().__init__(*args, **kwargs, **overrides)
+                    super().__init__(*args, **kwargs, **binding.overrides(args, kwargs))
 
             ConfrWrappedClass.__name__ = orig.__name__
-            return ConfrWrappedClass
+            ConfrWrappedClass._confr_binding = binding
+            wrapped = ConfrWrappedClass
+        bound_callables[f"{orig.__module__}.{orig.__qualname__}"] = wrapped
+        return wrapped
 
     if len(args): # used as confr.bind; args = (orig), subkeys = None
         return decorator(args[0])
@@ -62,9 +138,29 @@ def value(key=None, default=None):
     return Value(key, default)
 
 
+def validator(*args, keys=None):
+    """Registers a validation function, to be run by `confr.init(validate=module)`.
+
+    `keys` lists the config keys the validator reads. If omitted, they are inferred from
+    the `confr.value` arguments of a `confr.bind`-decorated validator. Validators whose keys
+    are known are skipped when none of those keys changed since the last successful run
+    (see `validate_cache` in `confr.init`).
+    """
+    def decorator(fn):
+        fn._confr_validator_keys = tuple(keys) if keys is not None else None
+        return fn
+
+    if len(args): # used as confr.validator
+        return decorator(args[0])
+    else: # used as confr.validator(keys=[...])
+        return decorator
+
+
 def init(
     *args,
     validate=None,
+    validate_cache=None, # path of a json file with digests of successfully validated inputs
+    validate_workers=None, # if set, validators run concurrently on this many threads
     verbose=True,
     ctx=False, # if True, conf will be active only during the `with`` block
     **kwargs,
@@ -72,55 +168,167 @@ def init(
 
     global global_conf
     if global_conf is None and verbose:
-        print("Declaring config.")
+        log.info("Declaring config.")
     else:
         if verbose:
-            print("Redeclaring config.")
+            log.info("Redeclaring config.")
+    log.event("init", redeclared=global_conf is not None)
 
     conf = Conf(*args, **kwargs, verbose=verbose)
+    conf.listeners.append(_dispatch_changes)
 
+    validate_kwargs = dict(verbose=verbose, cache_fp=validate_cache, max_workers=validate_workers)
     if ctx:
-        return ConfContext(global_conf, conf, validate)
+        return ConfContext(global_conf, conf, validate, validate_kwargs)
     else:
-        global_conf = conf
-        validate_conf(validate)
+        global_conf, old_conf = conf, global_conf
+        _dispatch_swap(old_conf, conf)
+        validate_conf(validate, **validate_kwargs)
 
 
-def validate_conf(validable, verbose=True):
-    if validable is None:
+def validate_conf(validable, verbose=True, cache_fp=None, max_workers=None):
+    validators = _collect_validators(validable)
+    if not validators:
         return
 
-    if inspect.ismodule(validable):
-        for k, v in validable.__dict__.items():
-            if callable(v):
-                if verbose:
-                    print(f"Validating {validable.__name__}.{k}.")
-                v()
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    digests = _read_validation_cache(cache_fp)
+    if cache_fp:
+        global_conf._materialize()
+    to_run = []
+    for name, fn in validators:
+        digest = _validator_digest(fn) if cache_fp else None
+        if digest is not None and digests.get(name) == digest:
+            if verbose:
+                log.info("Skipping %s, inputs unchanged.", name)
+            log.event("validate", name=name, status="skipped", duration=None)
+        else:
+            to_run.append((name, fn, digest))
+
+    def run(fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            return None, e
+        return time.perf_counter() - start, None
+
+    if max_workers and len(to_run) > 1:
+        # opt-in, since validators reading the same singleton may each create it
+        # each validator sees the caller's context, e.g. active confr.modified_conf overrides
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, fn)
+                for _, fn, _ in to_run
+            ]
+            results = [f.result() for f in futures]
+    else:
+        results = [run(fn) for _, fn, _ in to_run]
+
+    failed = None
+    for (name, _, digest), (duration, exception) in zip(to_run, results):
+        if exception is None:
+            if verbose:
+                log.info("Validated %s in %.3fs.", name, duration)
+            log.event("validate", name=name, status="ok", duration=duration)
+            if digest is not None:
+                digests[name] = digest
+        else:
+            log.error("Validation failed: %s.", name)
+            log.event("validate", name=name, status="failed", duration=None)
+            failed = failed or exception
+
+    _write_validation_cache(cache_fp, digests)
+    if failed is not None:
+        raise failed
+
+
+def _collect_validators(validable):
+    if validable is None:
+        return []
+
+    if isinstance(validable, ModuleType):
+        members = [
+            v for v in validable.__dict__.values()
+            if callable(v) and getattr(v, "__module__", None) == validable.__name__
+        ]
+        registered = [v for v in members if hasattr(v, "_confr_validator_keys")]
+        # modules without any @confr.validator run all the functions they define
+        return [(_validator_name(v), v) for v in (registered or members)]
     elif type(validable) in [list, tuple]:
-        for v in validable:
-            validate_conf(v)
+        return [name_and_fn for v in validable for name_and_fn in _collect_validators(v)]
     elif callable(validable):
-        if verbose:
-            print(f"Validating {validable.__name__}.")
-        validable()
+        return [(_validator_name(validable), validable)]
     else:
         raise Exception(f"Unknown type {type(validable)} passed to validate_conf ({validable}).")
 
 
+def _validator_name(fn):
+    return f"{fn.__module__}.{getattr(fn, '__qualname__', fn.__name__)}"
+
+
+def _validator_keys(fn):
+    keys = getattr(fn, "_confr_validator_keys", None)
+    if keys is not None:
+        return keys
+    binding = getattr(fn, "_confr_binding", None)
+    if binding is None:
+        return None # not a confr.bind function, inputs are unknown
+
+    subkeys = interpolate_key(binding.subkeys, global_conf)
+    return [binding.key(name, v, subkeys, global_conf) for name, _, v in binding.params]
+
+
+def _validator_digest(fn):
+    keys = _validator_keys(fn)
+    if keys is None:
+        return None
+    # including the keys interpolated in their values, e.g. base_lr for lr: ${base_lr}
+    return global_conf.fingerprint_inputs(global_conf.raw_deps(keys))
+
+
+def _read_validation_cache(cache_fp):
+    if cache_fp is None or not os.path.exists(cache_fp):
+        return {}
+    import json
+    with open(cache_fp, "r") as f:
+        return json.load(f)
+
+
+def _write_validation_cache(cache_fp, digests):
+    if cache_fp is None:
+        return
+    import json
+    with atomic_open(cache_fp, "w") as f: # a cache left half-written would fail to load
+        json.dump(digests, f, indent=4, sort_keys=True)
+
+
 def modified_conf(**kwargs):
     return ModifiedConf(global_conf, **kwargs)
 
 
-def write_conf(fp, except_keys=[]):
-    ret = strip_keys(global_conf.to_dict(), except_keys=except_keys)
-    write_yaml(fp, ret)
-    print(f"Wrote configurations for: {list(ret.keys())}")
+def write_conf(fp, except_keys=[], resolved=False, binary=False):
+    """Writes the active conf to `fp`. With resolved=True, a compiled conf (see confr.compiled) is
+    written, which can be loaded with `confr.init(compiled=fp)`. With binary=True, the compiled
+    conf is written in a memory-mappable binary format."""
+    if resolved or binary:
+        from confr.compiled import write_compiled
+        compiled = write_compiled(fp, global_conf, except_keys=except_keys, binary=binary)
+        log.info("Wrote compiled configurations for: %s", list(compiled["conf"].keys()))
+        return
+    global_conf._materialize()
+    if global_conf.overrides_dicts.get():
+        conf_dict = global_conf.to_dict()
+    else:
+        conf_dict = global_conf.c_original # written without copying
+    write_yaml(fp, conf_dict, except_keys=except_keys)
+    log.info("Wrote configurations for: %s", [k for k in conf_dict if k not in except_keys])
 
 
 def to_dict(*limit_keys, flat=False):
-    ret = global_conf.to_dict()
-    if limit_keys:
-        ret = with_keys(ret, limit_keys)
+    ret = global_conf.to_dict(limit_keys=limit_keys)
     if flat:
         ret = dict(flattened_items(ret))
     return ret
@@ -130,66 +338,122 @@ def get_global_conf():
     return global_conf
 
 
+def startup_profile(stages=False):
+    """Seconds spent in each phase of initializing the active conf (see `confr.init(profile=True)`),
+    or with `stages=True`, in each of its concurrent I/O stages."""
+    return dict(global_conf.profile.stages if stages else global_conf.profile.timings)
+
+
 def types():
     return global_conf.types
 
 
 def get_type(k):
-    return _get(global_conf.types, k)
+    return global_conf.get_type(k)
 
 
 def conf_patches():
     return global_conf.conf_patches
 
 
-def _get_call_overrides(cls_or_fn, args, kwargs, subkeys):
-    try:
-        bound_args = inspect.signature(cls_or_fn).bind(*args, **kwargs)
-    except Exception as e:
-        raise Exception(f"Unable to substitute values for {cls_or_fn.__name__}. {e}")
-    bound_args.apply_defaults()
-    default_args = dict(bound_args.arguments)
-
-    assert global_conf is not None, "Need to initialize config before executing configurable functions."
+class _Binding:
+    """The configurable parameters of a confr.bind-decorated callable, and their cached values.
+
+    The values are cached for the active conf, as long as none of the keys they were resolved
+    from are modified (see Conf.changed_since) and the same modified_conf overrides are active.
+    Values which aren't the same object on every `get` (e.g. lists which create objects) and
+    singletons (which the SingletonStore may evict or release) are looked up on every call.
+    """
+
+    def __init__(self, orig, subkeys):
+        self.orig = orig
+        self.subkeys = subkeys
+        self._params = None
+        self.cache = None # (conf, generation, overrides_dicts, interpolated subkeys, {param: value}, keys read)
+
+    @property
+    def params(self):
+        """[(name, position, Value)] of parameters with a confr.value default. position is None
+        for keyword-only parameters."""
+        if self._params is None:
+            import inspect
+
+            positional = [inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD]
+            params = []
+            for i, (name, param) in enumerate(inspect.signature(self.orig).parameters.items()):
+                v = param.default
+                if callable(v) and v == value: # kwarg=confr.value
+                    v = Value(None, None)
+                elif not isinstance(v, Value): # non-configurable value, e.g. kwarg=123
+                    continue
+                params.append((name, i if param.kind in positional else None, v))
+            self._params = params
+        return self._params
+
+    def key(self, name, v, subkeys, conf):
+        """The conf key of parameter `name` (with default `v`)."""
+        if v.key is None: # kwarg=confr.value(default="default")
+            return f"{subkeys}.{name}" if subkeys else name
+        elif v.key[0] == ".": # path is relative to subkeys
+            return interpolate_key(subkeys + v.key if subkeys else v.key, conf)
+        else: # path is absolute
+            return interpolate_key(v.key, conf)
+
+    def overrides(self, args, kwargs):
+        """Values of the configurable parameters which aren't in `args` or `kwargs`."""
+        conf = global_conf
+        assert conf is not None, "Need to initialize config before executing configurable functions."
+        overrides_dicts = conf.overrides_dicts.get()
+        cache = self.cache
+        if cache is not None and (cache[0] is not conf or cache[2] is not overrides_dicts):
+            cache = None
+        if cache is not None and cache[1] != conf.generation:
+            if conf.changed_since(cache[1], cache[5]):
+                cache = None
+            else: # none of the keys it was resolved from were modified
+                cache = self.cache = (conf, conf.generation) + cache[2:]
+        if cache is None:
+            with conf.recording() as deps:
+                subkeys = interpolate_key(self.subkeys, conf)
+            cache = self.cache = (conf, conf.generation, overrides_dicts, subkeys, {}, deps)
+        _, _, _, subkeys, bundle, deps = cache
+        if not args and not kwargs and len(bundle) == len(self.params):
+            conf._record_all(deps) # e.g. a singleton created with these values depends on them
+            return bundle
 
-    subkeys = interpolate_key(subkeys, global_conf)
-    try:
         ret = {}
-        for k, v in default_args.items():
-            if callable(v) and v == value: # kwarg=confr.value
-                get_key = f"{subkeys}.{k}" if subkeys else k
-                get_default = None
-            elif isinstance(v, Value): # kwarg=confr.value(...)
-                if v.key is None: # kwarg=confr.value(default="default")
-                    get_key = f"{subkeys}.{k}" if subkeys else k
-                    get_default = v.default
-                else: # kwarg=confr.value("key", default="default")
-                    if v.key[0] == ".":
-                        get_key = subkeys + v.key if subkeys else v.key # path is potentially relative to subkey
-                    else:
-                        get_key = v.key # path is absolute
-                    get_key = interpolate_key(get_key, global_conf)
-                    get_default = v.default
-            else: # non-configurable value, e.g. kwarg=123
-                continue
-            ret[k] = global_conf.get(get_key, get_default)
+        try:
+            for name, position, v in self.params:
+                if name in kwargs or (position is not None and position < len(args)):
+                    continue
+                if name in bundle:
+                    conf._record_all(deps)
+                    ret[name] = bundle[name]
+                    continue
+                with conf.recording(deps):
+                    ret[name], cacheable = conf._get_cacheable(self.key(name, v, subkeys, conf), v.default)
+                if cacheable:
+                    bundle[name] = ret[name]
+        except:
+            log.error("Trying to assign configurations to %s", self.orig.__name__)
+            raise
         return ret
-    except:
-        print(f"Trying to assign configurations to {cls_or_fn.__name__}")
-        raise
 
 
 class ConfContext:
-    def __init__(self, old_conf, swapped_conf, validate):
+    def __init__(self, old_conf, swapped_conf, validate, validate_kwargs=None):
         self.old_conf = old_conf
         self.swapped_conf = swapped_conf
         self.validate = validate
+        self.validate_kwargs = validate_kwargs or {}
 
     def __enter__(self):
         global global_conf
         global_conf = self.swapped_conf
-        validate_conf(self.validate)
+        _dispatch_swap(self.old_conf, self.swapped_conf)
+        validate_conf(self.validate, **self.validate_kwargs)
 
     def __exit__(self, *args):
         global global_conf
         global_conf = self.old_conf
+        _dispatch_swap(self.swapped_conf, self.old_conf)
@@ -0,0 +1,127 @@
+"""Logging and events.
+
+Messages go through the standard `logging` logger "confr", which by default prints them (without
+any decoration) to stdout, as confr always has. Silence it or redirect it as with any logger:
+
+    confr.log.configure(level=logging.WARNING)  # only warnings and errors
+    confr.log.configure(handler=logging.StreamHandler())  # log to stderr instead of stdout
+    confr.log.configure(handler=False)  # leave it to the root logger's handlers
+
+Messages are %-formatted only if they're actually emitted, so disabled messages cost a level check.
+
+Events are machine-readable counterparts of the messages: dicts with an "event" name and
+event-specific fields, passed to the handlers registered with `add_event_handler`:
+
+    load      {"fp"}                            a conf (or compiled conf) file was read
+    fetch     {"url", "status"}                 a remote conf file was requested (see confr.sources)
+    write     {"fp"}                            a conf file was written
+    override  {"key", "value", "former_value"}  an existing value was replaced
+    overrides {"source", "keys"}                values were overridden from env / CLI / Polyaxon
+    init      {"redeclared"}                    confr.init was called
+    validate  {"name", "status", "duration"}    status is "ok", "failed" or "skipped"
+    singleton_cache {"key", "cache_key", "hit"}  a singleton with `_cache: true` was looked up
+
+Events are only built when there are handlers, so they're free otherwise.
+"""
+import sys
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+
+event_handlers = []
+_logger = None
+
+
+def get_logger():
+    """The "confr" logger, set up with the default stdout handler on first use."""
+    global _logger
+    if _logger is None:
+        import logging
+
+        class StdoutHandler(logging.Handler):
+            """Writes to whatever `sys.stdout` is at the time (e.g. when it's captured or redirected)."""
+
+            def emit(self, record):
+                try:
+                    sys.stdout.write(self.format(record) + "\n")
+                except Exception:
+                    self.handleError(record)
+
+        logger = logging.getLogger("confr")
+        if not logger.handlers:
+            handler = StdoutHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.propagate = False
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.INFO)
+        _logger = logger
+    return _logger
+
+
+def configure(level=None, handler=None):
+    """Sets the level of the "confr" logger and/or replaces its default stdout handler.
+
+    handler=False removes the default handler, so records only propagate to the root logger.
+    """
+    logger = get_logger()
+    if level is not None:
+        logger.setLevel(level)
+    if handler is not None:
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+        if handler:
+            logger.addHandler(handler)
+        logger.propagate = not handler
+
+
+def log(level, msg, *args):
+    logger = get_logger()
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args)
+
+
+def debug(msg, *args):
+    log(DEBUG, msg, *args)
+
+
+def info(msg, *args):
+    log(INFO, msg, *args)
+
+
+def warning(msg, *args):
+    log(WARNING, msg, *args)
+
+
+def error(msg, *args):
+    log(ERROR, msg, *args)
+
+
+def add_event_handler(handler):
+    """Registers `handler(event: dict)`, called for every event (see module docstring)."""
+    event_handlers.append(handler)
+
+
+def remove_event_handler(handler):
+    event_handlers.remove(handler)
+
+
+def event(event_name, **fields):
+    if not event_handlers:
+        return
+    fields["event"] = event_name
+    for handler in list(event_handlers):
+        handler(fields)
+
+
+class Json:
+    """Lazily json-formatted value, for log messages that are likely to be disabled."""
+
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __str__(self):
+        import json
+
+        return json.dumps(self.v, indent=4, default=str)
@@ -1,11 +1,23 @@
 import os
-import json
-import aiocontextvars
-import argparse
+import array
+import itertools
+import threading
+import contextvars
+import contextlib
 from copy import deepcopy
 
-from confr.utils import import_python_object, read_yaml, flattened_items, recursive_merge, escape, unescape
-from confr import settings, plx
+from confr.utils import (
+    import_python_object, flattened_items, deep_merge, with_keys, escape, unescape, intern_keys, copy_tree,
+    interpolate_key, register_yaml_representers,
+)
+from confr.index import KeyIndex
+from confr.profiling import StartupProfile
+from confr.pipeline import Pipeline
+from confr.singletons import SingletonStore, DiskCache
+from confr.views import freeze, FrozenList, FrozenDict, ConfView
+from confr import settings, plx, log, sources, formats, arrays
+
+_generations = itertools.count(1) # shared by all Confs, so generations keep increasing across re-inits
 
 
 def _in(conf, k):
@@ -25,21 +37,30 @@ def _get(conf, k):
     return conf
 
 
-def _set(conf, k, v, strict=False, merge_mode="deep_merge", verbose=True):
+def _set(conf, k, v, strict=False, merge_mode="deep_merge", verbose=True, index=None):
+    """Sets `k` in `conf`. If `index` (a KeyIndex of `conf`) is given, it is used for lookups
+    and kept up to date."""
     assert merge_mode in ["deep_merge", "override"]
 
-    former_val = None
-    if _in(conf, k):
-        if _get(conf, k) != v:
-            former_val = _get(conf, k)
+    overridden, former_val = False, None
+    if (k in index) if index is not None else _in(conf, k):
+        current_val = index.get(k) if index is not None else _get(conf, k)
+        if current_val != v:
+            overridden, former_val = True, current_val
             if strict:
                 raise Exception(f"Can't override {k} (formerly {former_val}).")
 
+    if type(v) in [ConfView, FrozenDict, FrozenList]:
+        v = copy_tree(v, copy_leaves=False) # e.g. a value read with get, stored as a plain dict or list
+
+    full_key = k[:-1] if k.endswith("=") else k
     parts = k.split(".")
     if len(parts) > 1:
-        for part in parts[:-1]:
+        for i, part in enumerate(parts[:-1]):
             if part not in conf:
                 conf[part] = {}
+                if index is not None:
+                    index.add(".".join(parts[:i + 1]), conf, part)
             conf = conf[part]
         k = parts[-1]
 
@@ -48,31 +69,71 @@ def _set(conf, k, v, strict=False, merge_mode="deep_merge", verbose=True):
         k = k[:-1]
 
     if merge_mode == "deep_merge" and type(v) == dict and k in conf:
-        _deep_merge(conf, k, v)
+        _deep_merge(conf, k, v, index=index, key=full_key)
     else:
-        conf[k] = v
-
-    if verbose and former_val:
-        if type (v) == dict:
-            print(f"Override {k} = " + json.dumps(v, indent=4))
-        else:
-            print(f"Override {k} = {v}")
+        if index is not None:
+            index.discard(full_key)
+        conf[k] = copy_tree(v, copy_leaves=False) # not aliasing dicts or lists of the caller
+        if index is not None:
+            index.add(full_key, conf, k)
+
+    if overridden:
+        if verbose and former_val:
+            log.info("Override %s = %s", k, log.Json(v) if type(v) == dict else v)
+        if log.event_handlers:
+            log.event("override", key=full_key, value=v, former_value=former_val)
 
     return v
 
 
-def _deep_merge(conf, k, v):
+def _del(conf, k, index=None):
+    """Removes `k` (if it exists) from `conf`."""
+    parts = k.split(".")
+    for part in parts[:-1]:
+        if type(conf) != dict or part not in conf:
+            return
+        conf = conf[part]
+    if type(conf) == dict and parts[-1] in conf:
+        if index is not None:
+            index.discard(k)
+        del conf[parts[-1]]
+
+
+def _related(k1, k2):
+    """Whether one of the keys is the other key, or its parent."""
+    return k1 == k2 or k1.startswith(f"{k2}.") or k2.startswith(f"{k1}.")
+
+
+def _overridden(keys, overrides_dicts):
+    """Whether any of `keys` (or their parents or subkeys) is overridden."""
+    return any(_related(k, k2) for overrides_dict in overrides_dicts for k2 in overrides_dict for k in keys)
+
+
+def _creates_objects(v):
+    """Whether resolving `v` calls any python references (e.g. "@module.Class()")."""
+    if type(v) == str:
+        return v.startswith("@") and v.endswith("()")
+    elif type(v) == dict:
+        return "_callable" in v or any(_creates_objects(v2) for v2 in v.values())
+    elif type(v) == list:
+        return any(_creates_objects(v2) for v2 in v)
+    else:
+        return False
+
+
+def _deep_merge(conf, k, v, index=None, key=None):
+    """Merges dict `v` into `conf[k]` (see utils.deep_merge). `key` is the dotted key of
+    `conf[k]`, needed for updating `index`."""
     assert type(v) == dict, \
         f"Expected _deep_merge v to be dict, got {type(v)}."
 
-    if k not in conf or conf[k] is None:
+    if type(conf.get(k)) != dict:
+        if index is not None:
+            index.discard(key)
         conf[k] = {}
-
-    for k2, v2 in v.items():
-        if type(v2) == dict and not k2.endswith("="):
-            _deep_merge(conf[k], k2, v2)
-        else:
-            conf[k][k2.replace("=", "")] = v2
+        if index is not None:
+            index.add(key, conf, k)
+    deep_merge(v, conf[k], index=index, key=key)
 
 
 def _deep_merge_dicts(dicts, verbose=False):
@@ -106,44 +167,103 @@ def _interpolated_key(k, orig_val):
         return interpolated_key
 
 
-def _follow_file_refs(conf_dict, conf_dir, prefix=None, verbose=True):
+def _file_ref_locations(conf_dict, conf_dir):
+    """Locations referenced with `_file` in `conf_dict` (not including references in those files)."""
+    for v in conf_dict.values():
+        if type(v) == dict:
+            if "_file" in v:
+                yield sources.join(conf_dir, v["_file"])
+            else:
+                yield from _file_ref_locations(v, conf_dir)
+
+
+def _read_conf_file(location, resolve=True, with_types=False):
+    """(conf_fp, contents, types_fp, types) of the conf file at `location`, where conf_fp is
+    `location` with its extension (see formats.resolve) and the types are only read if
+    `with_types`. Doesn't log, since it runs in pipeline stages (see _log_reads)."""
+    conf_fp = formats.resolve(location) if resolve else location
+    contents = intern_keys(formats.read(conf_fp))
+    types_fp = formats.types_fp(conf_fp) if with_types else None
+    return conf_fp, contents, types_fp, formats.read(types_fp) if types_fp else None
+
+
+def _read_types_file(conf_fp):
+    types_fp = formats.types_fp(conf_fp)
+    return types_fp, formats.read(types_fp) if types_fp else None
+
+
+def _log_reads(verbose, *fps):
+    for fp in fps:
+        if fp is not None:
+            if verbose:
+                log.info("Reading %s.", fp)
+            log.event("load", fp=fp)
+
+
+def _follow_file_refs(conf_dict, conf_dir, pipeline, prefix=None, verbose=True, index=None, lazy=None):
+    """Replaces {"_file": fn} dicts with the contents of fn, which are read in `pipeline` stages.
+    If `lazy` is given, it's called with (k_with_prefix, conf_dict, k, conf_fp) instead of
+    loading fn."""
     loaded_files = {}
     for k, v in conf_dict.items():
         k_with_prefix = k if prefix is None else f"{prefix}.{k}"
 
         if type(v) == dict and "_file" in v:
-            fn = v["_file"]
-            if "." not in fn:
-                fn += ".yaml"
-            conf_fp = os.path.join(conf_dir, fn)
-            conf_dict[k] = read_yaml(conf_fp, verbose=verbose)
+            location = sources.join(conf_dir, v["_file"])
+            if lazy is not None:
+                lazy(k_with_prefix, conf_dict, k, formats.resolve(location))
+                continue
+            if index is not None:
+                index.discard(k_with_prefix)
+            conf_fp, conf_dict[k], _, _ = pipeline.result(f"read {location}", _read_conf_file, location)
+            _log_reads(verbose, conf_fp)
+            if index is not None:
+                index.add(k_with_prefix, conf_dict, k)
             loaded_files[k_with_prefix] = conf_fp
+            if type(conf_dict[k]) == dict:
+                for location2 in _file_ref_locations(conf_dict[k], conf_dir):
+                    pipeline.start(f"read {location2}", _read_conf_file, location2)
 
         if type(conf_dict[k]) == dict:
-            loaded_files.update(
-                _follow_file_refs(conf_dict[k], conf_dir, prefix=k_with_prefix)
-            )
+            loaded_files.update(_follow_file_refs(
+                conf_dict[k], conf_dir, pipeline, prefix=k_with_prefix, verbose=verbose, index=index, lazy=lazy,
+            ))
 
     return loaded_files
 
 
-def _load_types_dicts(loaded_conf_fps, verbose=True):
+def _load_types_dicts(loaded_conf_fps, pipeline, verbose=True):
+    for conf_fp in loaded_conf_fps.values():
+        pipeline.start(f"types {conf_fp}", _read_types_file, conf_fp)
     ret = {}
     for k, conf_fp in loaded_conf_fps.items():
-        types_fp = conf_fp.replace(".yaml", "_types.yaml")
-        if os.path.exists(types_fp):
-            ret[k] = read_yaml(types_fp, verbose=verbose)
+        types_fp, types = pipeline.result(f"types {conf_fp}", _read_types_file, conf_fp)
+        if types_fp:
+            _log_reads(verbose, types_fp)
+            ret[k] = types
     return ret
 
 
+def _types_to_primitives(types):
+    """Like _leaves_to_primitives, but `types` can also be a single type (name)."""
+    if type(types) == dict:
+        _leaves_to_primitives(types)
+        return types
+    elif types in settings.PRIMITIVE_TYPES or type(types) == arrays.ArrayType:
+        return types
+    else:
+        return arrays.parse_type(types)
+
+
 def _leaves_to_primitives(d):
+    """Replaces type names (e.g. "int" or "array[float32]") in the types dict `d` with types."""
     for k, v in d.items():
-        if v in settings.PRIMITIVE_TYPES:
+        if v in settings.PRIMITIVE_TYPES or type(v) == arrays.ArrayType:
             continue
         elif type(v) == dict:
             _leaves_to_primitives(v)
         elif type(v) in settings.PRIMITIVE_TYPES:
-            d[k] = settings.STR_TO_TYPE[v]
+            d[k] = arrays.parse_type(v)
         else:
             raise Exception(
                 f"Expected value of {k} to be a primitive (in {settings.PRIMITIVE_TYPES}), "
@@ -151,7 +271,52 @@ def _leaves_to_primitives(d):
             )
 
 
+def _decode_override(v, expected_type=None):
+    """Decodes a string override (e.g. from an env var) into a value of `expected_type`.
+
+    Strings are kept as they are if a str is expected. Otherwise JSON literals (numbers, true,
+    false, null, lists, dicts) are decoded, as are YAML flow collections (e.g. `[a, b]`);
+    anything else remains a string.
+    """
+    if expected_type == str:
+        return v
+
+    import json
+    try:
+        decoded = json.loads(v)
+    except ValueError:
+        if not v.lstrip().startswith(("[", "{")):
+            return v
+        import yaml
+        try:
+            decoded = yaml.safe_load(v)
+        except yaml.YAMLError:
+            return v
+
+    if expected_type == float and type(decoded) == int:
+        decoded = float(decoded)
+    return decoded
+
+
+DELETE = object() # value for removing a key with Conf.update
+
+
+class _Lazy:
+    """Placeholder for a conf value which is loaded when it's first accessed (see Conf._materialize)."""
+
+    __slots__ = ("load", "conf_fp")
+
+    def __init__(self, load, conf_fp=None):
+        self.load = load
+        self.conf_fp = conf_fp # set for `_file` references
+
+    def __repr__(self):
+        return "<not loaded>"
+
+
 def _get_cli_arg(arg_name, **kwargs):
+    import argparse
+
     arg_name_sane = arg_name.replace("-", "_").replace(".", settings.DOT_REPLACEMENT)
     parser = argparse.ArgumentParser(allow_abbrev=False)
     parser.add_argument(arg_name, dest=arg_name_sane, **kwargs)
@@ -177,20 +342,76 @@ class Conf:
         cli_overrides_prefix="--",
         validate_types=True,
         set_missing_types=True,
+        compiled=None,
+        lazy_file_refs=False,
+        profile=False, # log how long each phase of init took (see self.profile)
+        singleton_cache_dir=settings.SINGLETON_CACHE_DIR, # where singletons with `_cache: true` are stored
+        singleton_max_items=None, # evict the least recently used singletons beyond this many
+        singleton_max_bytes=None, # evict the least recently used singletons beyond this (estimated) size
+        weak_singletons=(), # keys whose singletons are only weakly referenced
+        override_singleton_max_items=16, # singletons kept for modified_conf overrides, least recently used evicted
+        concurrent_init=True, # read files and fetch Polyaxon inputs in background threads (see confr.pipeline)
     ):
 
+        self.profile = StartupProfile()
+        self.pipeline = Pipeline(self.profile, concurrent=concurrent_init)
         self._plx_inputs = None
+        if settings.IN_POLYAXON:
+            self.pipeline.start("plx", plx.inputs)
+        if not (compiled or conf or conf_files) and base_conf:
+            # read while the conf patches are looked up in Polyaxon inputs and CLI args
+            base_location = sources.join(conf_dir, base_conf)
+            self.pipeline.start(f"read {base_location}", _read_conf_file, base_location, True, True)
         self.merge_mode = merge_mode
-        self.conf_patches = tuple(conf_patches) + self.conf_patches_overrides()
+        self.conf_patches = tuple(conf_patches) + self.conf_patches_overrides(cli=cli_overrides)
         self.verbose = verbose
         self.strict = strict
-        self.c_singletons = {}
+        self.c_singletons = SingletonStore(
+            max_items=singleton_max_items, max_bytes=singleton_max_bytes, weak_keys=weak_singletons)
+        self.c_singleton_deps = {} # singleton key -> keys read while the singleton was created
+        # singletons created with overridden inputs (see _singleton), by "{key}.{fingerprint}"
+        if singleton_max_items is not None and override_singleton_max_items is not None:
+            override_singleton_max_items = min(singleton_max_items, override_singleton_max_items)
+        self.c_override_singletons = SingletonStore(
+            max_items=override_singleton_max_items, max_bytes=singleton_max_bytes, weak_keys=weak_singletons,
+            on_evict=lambda k: self.c_override_deps.pop(k, None))
+        self.c_override_deps = {}
+        self.c_known_deps = {} # singleton key -> keys read when it was last created (with or without overrides)
+        self.c_lists = {} # dotted key -> (raw list, its resolved read-only version)
+        self.c_views = {} # dotted key -> (generation, ConfView of its dict), while no overrides are active
+        self.singleton_cache = DiskCache(singleton_cache_dir)
+        self._recording = contextvars.ContextVar("recording", default=()) # sets collecting keys read by get
+        self._volatile = contextvars.ContextVar("volatile", default=()) # lists collecting uncacheable reads
+        self.generation = self.created_generation = next(_generations) # increased with every batch of modifications
+        self.key_generations = {} # dotted key -> generation in which it was last set
+        self.subtree_generations = {} # dotted key -> generation in which it or any of its subkeys was last set
+        self.listeners = [] # fns called with (conf, keys) after each batch of modifications
         self.c_original = {}
-        self.overrides_dicts = aiocontextvars.ContextVar("overrides_dicts", default=[])
+        self.key_types = {} # dotted key -> type, declared in types files or inferred from its value
+        self.c_index = KeyIndex(self.c_original)
+        self.c_lazy = {} # dotted key -> _Lazy placeholder, for values which haven't been loaded yet
+        self._lazy_lock = threading.RLock()
+        self._lazy_hooks = None # settings for processing lazily loaded values, set at the end of init
+        self.lazy_file_refs = lazy_file_refs
+        self.overrides_dicts = contextvars.ContextVar("overrides_dicts", default=[])
 
         conf_dicts, types_dicts, fps = [], [], []
 
-        if conf:
+        if compiled:
+            """Loads a compiled conf (see confr.compiled), skipping file refs and type inference."""
+            assert not conf and not conf_files, "Can't specify conf or conf_files when using init(compiled=...)."
+            from confr.compiled import read_compiled, compiled_types, is_binary, BinaryCompiled
+            with self.profile.phase("parse"):
+                if is_binary(compiled):
+                    binary = BinaryCompiled(compiled, verbose=verbose)
+                    for k in binary.keys():
+                        self._set_lazy(k, self.c_original, k, lambda k=k: binary.load(k))
+                    types_dicts.append(compiled_types(binary.header))
+                else:
+                    compiled = read_compiled(compiled, verbose=verbose)
+                    conf_dicts.append(compiled["conf"])
+                    types_dicts.append(compiled_types(compiled["_compiled"]))
+        elif conf:
             """Loads conf directly from conf dict."""
             if type(conf) == dict:
                 conf_dicts.append(conf)
@@ -202,13 +423,17 @@ class Conf:
             assert conf_patches == (), "Can't specify conf_patches when using init(conf={...})."
         elif conf_files:
             """Loads conf from conf files."""
-            fps = [conf_files] if type(conf_files) == str else conf_files
+            fps = [conf_files] if type(conf_files) == str else list(conf_files)
         else:
-            """Loads {conf_dir}/{base_conf}.yaml and all {conf_dir}/{conf_patch}.yaml files."""
+            """Loads {conf_dir}/{base_conf}.yaml and all {conf_dir}/{conf_patch}.yaml files
+            (or files of other formats, see confr.formats)."""
             fps = [
-                os.path.join(conf_dir, base + ".yaml")
+                sources.join(conf_dir, base)
                 for base in ((base_conf,) if base_conf else tuple()) + self.conf_patches
             ]
+        resolve = not conf_files # conf_files are read as they're named
+        for location in fps:
+            self.pipeline.start(f"read {location}", _read_conf_file, location, resolve, True)
 
         if types:
             if type(types) == list:
@@ -217,96 +442,333 @@ class Conf:
                 assert type(types) == dict
                 types_dicts.append(types)
 
-        for conf_fp in fps:
-            conf_dicts.append(read_yaml(conf_fp, verbose=verbose))
-            types_fp = conf_fp.replace(".yaml", "_types.yaml")
-            if os.path.exists(types_fp) and ".yaml" in conf_fp:
-                types_dicts.append(read_yaml(types_fp, verbose=verbose))
-
-        for conf_dict in conf_dicts:
-            self._init_conf_dict(conf_dict)
-
-        if overrides:
-            if verbose:
-                print(f"Overwriting {len(overrides)} configs with `overrides`")
-            # Merging with actual conf (rather than using self.add_overrides)
-            # since these overrides are permanent (and self.add_overrides) is more limited.
-            self._init_conf_dict(overrides)
+        with self.profile.phase("merge"):
+            for conf_dict in conf_dicts:
+                self._init_conf_dict(conf_dict)
+
+        # merged in order, each while the following files are still being read
+        for location in fps:
+            with self.profile.phase("parse"):
+                conf_fp, conf_dict, types_fp, types_dict = self.pipeline.result(
+                    f"read {location}", _read_conf_file, location, resolve, True)
+                _log_reads(verbose, conf_fp, types_fp)
+                if types_fp:
+                    types_dicts.append(types_dict)
+            with self.profile.phase("merge"):
+                self._init_conf_dict(conf_dict)
+
+        with self.profile.phase("merge"):
+            if overrides:
+                if verbose:
+                    log.info("Overwriting %d configs with `overrides`", len(overrides))
+                # Merging with actual conf (rather than using self.add_overrides)
+                # since these overrides are permanent (and self.add_overrides) is more limited.
+                self._init_conf_dict(overrides)
 
         if env_overrides:
-            self.override_from_env(env_overrides_prefix)
-        if cli_overrides:
-            self.override_from_cli(cli_overrides_prefix, file_refs_only=True)
-        loaded_conf_fps = self.follow_file_refs(conf_dir)
-
-        merged_types_dicts = _load_types_dicts(loaded_conf_fps, verbose=self.verbose)
-        self.types = _deep_merge_dicts(types_dicts + [merged_types_dicts])
-        _leaves_to_primitives(self.types)
-
-        if validate_types:
-            self.validate_types()
-        if set_missing_types:
-            self.set_missing_types()
+            with self.profile.phase("env"):
+                self.override_from_env(env_overrides_prefix, types_dicts=types_dicts)
+        if compiled:
+            with self.profile.phase("types"):
+                types = _deep_merge_dicts(types_dicts)
+                _leaves_to_primitives(types)
+                self.types = types
+        else:
+            if cli_overrides:
+                with self.profile.phase("cli"):
+                    self.override_from_cli(cli_overrides_prefix, file_refs_only=True, items=self.c_index.items())
+            with self.profile.phase("refs"):
+                loaded_conf_fps = self.follow_file_refs(conf_dir)
+
+            with self.profile.phase("types"):
+                merged_types_dicts = _load_types_dicts(loaded_conf_fps, self.pipeline, verbose=self.verbose)
+                types = _deep_merge_dicts(types_dicts + [merged_types_dicts])
+                _leaves_to_primitives(types)
+                self.types = types
+
+                if validate_types:
+                    self.validate_types()
+                if set_missing_types:
+                    self.set_missing_types()
         if cli_overrides:
-            self.override_from_cli(cli_overrides_prefix)
-        self.maybe_override_plx()
+            with self.profile.phase("cli"):
+                self.override_from_cli(cli_overrides_prefix, items=self.c_index.items())
+        if settings.IN_POLYAXON:
+            with self.profile.phase("plx"):
+                self.maybe_override_plx()
+        self.pipeline.clear()
+        self._lazy_hooks = dict(
+            conf_dir=conf_dir,
+            validate_types=validate_types,
+            set_missing_types=set_missing_types,
+            cli_overrides_prefix=cli_overrides_prefix if cli_overrides else None,
+        )
+        if profile:
+            log.info("%s", self.profile.report())
 
     def _init_conf_dict(self, conf_dict):
         for k, v in conf_dict.items():
             self.set(k, v)
 
-    def override_from_env(self, env_overrides_prefix):
-        for k, v in os.environ.items():
-            if (
-                k.startswith(env_overrides_prefix) and
-                k not in ["CONFR_BASE_CONF", "CONFR_CONF_DIR"]
-            ):
-                k = unescape(k[len(env_overrides_prefix):])
-                self.set(k, v)
+    def override_from_env(self, env_overrides_prefix, types_dicts=()):
+        """Applies {env_overrides_prefix}{key} env vars (with dots in key escaped) as one layer of
+        overrides. Values are decoded according to the type of the key in `types_dicts`, or
+        the type of its current value (see _decode_override)."""
+        raw_overrides = {
+            unescape(k[len(env_overrides_prefix):]): v
+            for k, v in os.environ.items()
+            if k.startswith(env_overrides_prefix) and k not in settings.ENV_SETTINGS
+        }
+        if not raw_overrides:
+            return
+
+        types = _deep_merge_dicts(types_dicts)
+        _leaves_to_primitives(types)
+        layer = {}
+        for k, v in raw_overrides.items():
+            if _in(types, k):
+                expected_type = _get(types, k)
+            elif k in self.c_index and not isinstance(self.c_index.get(k), _Lazy):
+                expected_type = type(self.c_index.get(k))
+            else:
+                expected_type = None
+            layer[k] = _decode_override(v, expected_type)
+
+        if self.verbose:
+            log.info("Overriding %d values from env.", len(layer))
+        self._init_conf_dict(layer)
+        log.event("overrides", source="env", keys=list(layer))
+
+    def override_from_cli(self, prefix, file_refs_only=False, items=None):
+        import argparse
 
-    def override_from_cli(self, prefix, file_refs_only=False):
         parser = argparse.ArgumentParser(allow_abbrev=False, description='Override confr values.')
 
-        for k, v in flattened_items(self.to_dict()):
+        for k, v in (self.flattened_items() if items is None else items):
+            if isinstance(v, _Lazy):
+                continue # overridden once loaded
             if file_refs_only:
                 if k.endswith("_file"):
                     parser.add_argument(f"{prefix}{k}", dest=escape(k))
             else:
-                parser.add_argument(f"{prefix}{k}", dest=escape(k), type=_get(self.types, k))
+                parser.add_argument(f"{prefix}{k}", dest=escape(k), type=self.key_types.get(k))
 
         args = vars(parser.parse_known_args()[0])
         args = {unescape(k_escaped): v for k_escaped, v in args.items() if v is not None}
         if args:
-            print(f"Overriding {len(args)} arguments from CLI.")
+            log.info("Overriding %d arguments from CLI.", len(args))
             for k, v in args.items():
                 self.set(k, v)
+            log.event("overrides", source="cli", keys=list(args))
 
-    def follow_file_refs(self, conf_dir):
-        return _follow_file_refs(self.c_original, conf_dir, verbose=self.verbose)
+    def _set_lazy(self, k, parent, leaf, load, conf_fp=None):
+        """Sets `k` (i.e. `parent[leaf]`) to a placeholder, which is replaced with `load()` on first access."""
+        self.c_index.discard(k)
+        parent[leaf] = self.c_lazy[k] = _Lazy(load, conf_fp=conf_fp)
+        self.c_index.add(k, parent, leaf)
+
+    def _set_lazy_file_ref(self, k, parent, leaf, conf_fp):
+        self._set_lazy(k, parent, leaf, lambda: formats.load(conf_fp, verbose=self.verbose), conf_fp=conf_fp)
+
+    def _materialize(self, k=None):
+        """Loads the lazy values needed for accessing `k` (its parents and subkeys), or all of them."""
+        if not self.c_lazy:
+            return
+        with self._lazy_lock:
+            if k is None:
+                while self.c_lazy:
+                    self._load_lazy(next(iter(self.c_lazy)))
+                return
+
+            parts = k.split(".")
+            for i in range(1, len(parts) + 1):
+                k_prefix = ".".join(parts[:i])
+                if k_prefix in self.c_lazy:
+                    self._load_lazy(k_prefix)
+            while True:
+                subkeys = [k2 for k2 in self.c_lazy if k2.startswith(f"{k}.")]
+                if not subkeys:
+                    break
+                for k2 in subkeys:
+                    self._load_lazy(k2)
+
+    def _load_lazy(self, k):
+        lazy = self.c_lazy.pop(k)
+        parent, leaf = self.c_index.entries[k]
+        self.c_index.discard(k)
+        parent[leaf] = lazy.load()
+        self.c_index.add(k, parent, leaf)
+
+        hooks = self._lazy_hooks
+        if hooks is None:
+            return # still in __init__, which processes all loaded values itself
+        if lazy.conf_fp is not None:
+            self.follow_file_refs(hooks["conf_dir"], k=k)
+            types_dicts = _load_types_dicts({k: lazy.conf_fp}, self.pipeline, verbose=self.verbose)
+            if k in types_dicts:
+                self._set_types(k, _types_to_primitives(types_dicts[k]))
+            if hooks["validate_types"]:
+                self.validate_types(k)
+            if hooks["set_missing_types"]:
+                self.set_missing_types(k)
+        if hooks["cli_overrides_prefix"]:
+            self.override_from_cli(hooks["cli_overrides_prefix"], items=self.c_index.items(k))
+
+    def follow_file_refs(self, conf_dir, k=None):
+        """Loads `_file` references (in the subtree of `k`), or replaces them with lazy placeholders."""
+        conf_dict = self.c_original if k is None else self.c_index.get(k)
+        if type(conf_dict) != dict:
+            return {}
+        lazy = self._set_lazy_file_ref if self.lazy_file_refs else None
+        if lazy is None:
+            for location in _file_ref_locations(conf_dict, conf_dir):
+                self.pipeline.start(f"read {location}", _read_conf_file, location)
+        return _follow_file_refs(
+            conf_dict, conf_dir, self.pipeline, prefix=k, verbose=self.verbose, index=self.c_index, lazy=lazy,
+        )
 
     def get(self, k, default=None):
-        use_singletons = True
         if k.startswith("&"):
-            k = k[1:]
-            use_singletons = False
+            k = k[1:] # no longer needed, since singletons are looked up by their exact key
+        self._materialize(k)
+        self._record(k)
 
         for overrides_dict in self.overrides_dicts.get()[::-1]:
             if k in overrides_dict:
                 return self._get_val(k, overrides_dict[k])
 
-        if use_singletons and _in(self.c_singletons, k):
-            return _get(self.c_singletons, k)
-        elif _in(self.c_original, k):
-            return self._get_val(k, _get(self.c_original, k))
+        if k in self.c_index:
+            return self._get_val(k, self.c_index.get(k))
         else:
             if default is None:
                 raise Exception(f"no config '{k}' found in {list(self.c_original.keys())}")
             else:
                 return default
 
+    def _get_cacheable(self, k, default=None):
+        """(get(k, default), whether get returns the same value until the conf is modified)."""
+        volatile = []
+        token = self._volatile.set(self._volatile.get() + (volatile,))
+        try:
+            return self.get(k, default), not volatile
+        finally:
+            self._volatile.reset(token)
+
+    def _record(self, k):
+        """Adds `k` to the dependencies of the singletons being created."""
+        for deps in self._recording.get():
+            deps.add(k)
+
+    def _override_of(self, k, default):
+        """The value of `k` in the active overrides, or `default` if it isn't overridden."""
+        for overrides_dict in self.overrides_dicts.get()[::-1]:
+            if k in overrides_dict:
+                return overrides_dict[k]
+        return default
+
+    def _get_raw(self, k):
+        """The value of `k` as written in the active conf (including overrides)."""
+        self._materialize(k)
+        for overrides_dict in self.overrides_dicts.get()[::-1]:
+            if k in overrides_dict:
+                return overrides_dict[k]
+        if k not in self.c_index:
+            raise Exception(f"no config '{k}' found in {list(self.c_original.keys())}")
+        return self.c_index.get(k)
+
+    def select(self, pattern, resolve=False):
+        """Returns {dotted_key: value} for all keys matching a glob pattern (see KeyIndex.match).
+
+        With resolve=False, values are returned as in `to_dict`, otherwise as in `get`.
+        """
+        self._materialize()
+        ret = {}
+        overrides_dicts = self.overrides_dicts.get()[::-1]
+        for k in self.c_index.match(pattern):
+            if resolve:
+                ret[k] = self.get(k)
+                continue
+            for overrides_dict in overrides_dicts:
+                if k in overrides_dict:
+                    ret[k] = deepcopy(overrides_dict[k])
+                    break
+            else:
+                ret[k] = deepcopy(self.c_index.get(k))
+        return ret
+
     def set(self, k, v, merge_mode=None):
         merge_mode = merge_mode if merge_mode else self.merge_mode
-        _set(self.c_original, k, v, verbose=self.verbose, strict=self.strict, merge_mode=merge_mode)
+        self._materialize(k[:-1] if k.endswith("=") else k)
+        _set(
+            self.c_original, k, v,
+            verbose=self.verbose, strict=self.strict, merge_mode=merge_mode, index=self.c_index,
+        )
+        self._changed([k[:-1] if k.endswith("=") else k])
+
+    def update(self, updates, atomic=True, merge_mode=None, validate=None):
+        """Sets all {k: v} in `updates` in one batch.
+
+        Types of the updated keys, and `validate` (a function or list of functions) are checked
+        once all updates are applied. If anything fails and atomic=True, all updates are rolled back.
+        Singletons depending on the updated keys are recreated on next access. Keys set to DELETE
+        are removed.
+        """
+        merge_mode = merge_mode if merge_mode else self.merge_mode
+        keys = [k[:-1] if k.endswith("=") else k for k in updates]
+        for k in keys:
+            self._materialize(k)
+
+        undo = [] # (k, existed, former value) in the order of updates
+        try:
+            for (k_update, v), k in zip(updates.items(), keys):
+                if atomic:
+                    undo.append(self._undo_entry(k))
+                if v is DELETE:
+                    _del(self.c_original, k, index=self.c_index)
+                else:
+                    _set(
+                        self.c_original, k_update, v,
+                        verbose=False, strict=self.strict, merge_mode=merge_mode, index=self.c_index,
+                    )
+            for k, v in zip(keys, updates.values()):
+                if v is not DELETE:
+                    self.validate_types(k)
+            for fn in (validate if type(validate) in [list, tuple] else [validate] if validate else []):
+                fn()
+        except:
+            for k, existed, former_val in reversed(undo):
+                if existed:
+                    _set(self.c_original, k, former_val, verbose=False, merge_mode="override", index=self.c_index)
+                else:
+                    _del(self.c_original, k, index=self.c_index)
+            raise
+        finally:
+            self._changed(keys, notify=False)
+        self._notify(keys)
+
+        if self.verbose:
+            log.info("Updated %d configs.", len(keys))
+
+    def apply_diff(self, changes, atomic=True, validate=None):
+        """Applies Changes (see confr.changes.diff) with one `update`, so only the singletons whose
+        inputs changed are recreated."""
+        updates = {c.key: DELETE for c in changes if c.kind == "removed"}
+        updates.update({
+            f"{c.key}=": c.new # copied by _set
+            for c in changes if c.kind in ["added", "changed"]
+        })
+        self.update(updates, atomic=atomic, validate=validate)
+
+    def _undo_entry(self, k):
+        """What's needed to restore `k` to its current state: (key, existed, former value)."""
+        parts = k.split(".")
+        for i in range(1, len(parts) + 1):
+            k_prefix = ".".join(parts[:i])
+            if k_prefix not in self.c_index:
+                return k_prefix, False, None # rolled back by deleting the first missing parent
+        former_val = self.c_index.get(k)
+        # dicts are modified in place when deep merging
+        return k, True, copy_tree(former_val, copy_leaves=False) if type(former_val) == dict else former_val
 
     def __getitem__(self, k):
         return self.get(k)
@@ -326,28 +788,206 @@ class Conf:
             elif orig_val.startswith("@"):
                 if k is None:
                     # _get_val is called for a list element, therefore we can't memoize it
-                    return self._get_python_ref(None, orig_val)
+                    return self._get_python_ref(orig_val)
                 else:
-                    if _in(self.c_singletons, k):
-                        return _get(self.c_singletons, k)
-                    else:
-                        # memoize the result
-                        return _set(self.c_singletons, k, self._get_python_ref(orig_val))
+                    return self._singleton(k, orig_val, lambda: self._get_python_ref(orig_val))
             else:
                 return orig_val
+        elif type(orig_val) == array.array:
+            return arrays.view(orig_val)
         elif type(orig_val) == list:
             # TODO handle int indexes
-            return [self._get_val(None, v) for v in orig_val]
+            if k is None:
+                return [self._get_val(None, v) for v in orig_val]
+            cached = self.c_lists.get(k)
+            if cached is not None and cached[0] is orig_val:
+                return cached[1]
+            expected_type = self.key_types.get(k)
+            if type(expected_type) == arrays.ArrayType: # e.g. set or overridden since it was validated
+                resolved = arrays.view(expected_type(orig_val))
+                self.c_lists[k] = (orig_val, resolved)
+                return resolved
+            if _creates_objects(orig_val): # each access creates new objects, so it can't be cached
+                for volatile in self._volatile.get():
+                    volatile.append(k)
+                return [self._get_val(None, v) for v in orig_val]
+            register_yaml_representers() # so that yaml.safe_dump can write the frozen list
+            resolved = freeze([self._get_val(None, v) for v in orig_val])
+            self.c_lists[k] = (orig_val, resolved)
+            return resolved
         elif type(orig_val) == dict and "_callable" in orig_val:
-            return _set(self.c_singletons, k, self._get_python_ref_with_overrides(k, orig_val))
-        elif type(orig_val) == dict and "." in k: # TODO this causes test_interpolation to fail
-            return {
-                k2: self._get_val(f"{k}.{k2}", v)
-                for k2, v in orig_val.items()
-            }
+            return self._singleton(k, orig_val, lambda: self._get_python_ref_with_overrides(k, orig_val))
+        elif type(orig_val) == dict and k is not None:
+            if self._recording.get():
+                self._record_all(self.raw_deps([k])) # keys which the view's values may be resolved from
+            if self.overrides_dicts.get():
+                return ConfView(self, k, orig_val)
+            # views are dropped after any modification, since their values may be interpolated from anywhere
+            generation, view = self.c_views.get(k, (None, None))
+            if generation != self.generation or view.raw is not orig_val:
+                view = ConfView(self, k, orig_val)
+                self.c_views[k] = (self.generation, view)
+            return view
         else:
             return orig_val
 
+    def _singleton(self, k, orig_val, create):
+        """The singleton of `k`, memoized along with the keys it depends on.
+
+        While overrides are active, singletons depending on overridden keys are memoized separately
+        for each fingerprint of the (overridden) values of the keys they depend on (see
+        _override_key), so that they're created once per distinct set of inputs and the base
+        singletons are never replaced. If a singleton's dependencies aren't known yet, it's created
+        once to find them out.
+        """
+        for volatile in self._volatile.get(): # not cached by bindings, so that the store can drop it
+            volatile.append(k)
+        overrides_dicts = self.overrides_dicts.get()
+        if k in self.c_singletons:
+            deps = self.c_singleton_deps.get(k, {k})
+            if not overrides_dicts or not _overridden(deps, overrides_dicts):
+                self._record_all(deps)
+                return self.c_singletons.get(k)
+        if overrides_dicts and k in self.c_known_deps:
+            override_key = self._override_key(k, self.c_known_deps[k])
+            if override_key in self.c_override_singletons:
+                self._record_all(self.c_override_deps[override_key])
+                return self.c_override_singletons.get(override_key)
+
+        with self.recording({k}) as deps:
+            singleton = create()
+        self._record_all(deps)
+        self.c_known_deps[k] = deps
+
+        if overrides_dicts and _overridden(deps, overrides_dicts):
+            override_key = self._override_key(k, deps)
+            self.c_override_singletons.set(override_key, singleton)
+            self.c_override_deps[override_key] = deps
+            return singleton
+        self.c_singleton_deps[k] = deps
+        return self.c_singletons.set(k, singleton)
+
+    def _override_key(self, k, deps):
+        """"{k}.{fingerprint}" of the inputs (`deps`) of the singleton of `k` (see fingerprint_inputs)."""
+        return f"{k}.{self.fingerprint_inputs(deps)}"
+
+    def fingerprint_inputs(self, keys):
+        """Fingerprint of the values of `keys` (as written in the conf) and of the active overrides
+        of them, their parents or subkeys. Include the keys interpolated in their values (see
+        raw_deps) to fingerprint what they resolve to."""
+        from confr.compiled import fingerprint
+
+        keys = sorted(keys)
+        values = {k: self._override_of(k, self.c_index.get(k)) for k in keys}
+        overrides = [
+            (k2, v) for overrides_dict in self.overrides_dicts.get() for k2, v in overrides_dict.items()
+            if any(_related(k2, k) for k in keys)
+        ]
+        return fingerprint([values, overrides])
+
+    def _record_all(self, deps):
+        # the dependencies of a singleton are also dependencies of singletons created using it
+        if self._recording.get():
+            for dep in deps:
+                self._record(dep)
+
+    def _changed(self, keys, notify=True):
+        """Records that `keys` were modified, drops everything derived from them and (with
+        notify=True) notifies listeners."""
+        self._bump(keys)
+        self._invalidate(keys)
+        if notify:
+            self._notify(keys)
+
+    def _bump(self, keys):
+        self.generation = next(_generations)
+        for k in keys:
+            self.key_generations[k] = self.generation
+            parts = k.split(".")
+            for i in range(1, len(parts) + 1):
+                self.subtree_generations[".".join(parts[:i])] = self.generation
+
+    def _notify(self, keys):
+        for listener in list(self.listeners):
+            listener(self, list(keys))
+
+    def generation_of(self, k=None):
+        """The generation in which `k`, one of its parents or subkeys was last modified (or in
+        which anything was last modified, if k is None)."""
+        if k is None:
+            return self.generation
+        generation = self.subtree_generations.get(k, self.created_generation)
+        parts = k.split(".")
+        for i in range(1, len(parts)):
+            generation = max(generation, self.key_generations.get(".".join(parts[:i]), 0))
+        return generation
+
+    def changed_since(self, generation, keys):
+        """Whether any of `keys` was modified after `generation`."""
+        return self.generation != generation and any(self.generation_of(k) > generation for k in keys)
+
+    @contextlib.contextmanager
+    def recording(self, deps=None):
+        """Adds the keys read with `get` within the block to the set `deps` (a new set by default)."""
+        deps = set() if deps is None else deps
+        token = self._recording.set(self._recording.get() + (deps,))
+        try:
+            yield deps
+        finally:
+            self._recording.reset(token)
+
+    def raw_deps(self, keys):
+        """`keys` and the keys interpolated in their values (or the values of their subkeys), transitively."""
+        deps, stack = set(), list(keys)
+        while stack:
+            k = stack.pop()
+            if k in deps:
+                continue
+            deps.add(k)
+            v = self._override_of(k, self.c_index.get(k))
+            items = flattened_items(v, prefix=k) if type(v) == dict else [(k, v)]
+            for k2, v2 in items:
+                if _is_interpolation_val(v2):
+                    stack.append(_interpolated_key(k2, v2))
+        return deps
+
+    def _invalidate(self, keys):
+        """Drops singletons which depend (directly or via other singletons) on any of `keys`."""
+        for k in [k for k in self.c_lists if any(_related(k, k2) for k2 in keys)]:
+            del self.c_lists[k]
+        for override_key, deps in list(self.c_override_deps.items()):
+            if any(_related(k2, dep) for k2 in keys for dep in deps):
+                del self.c_override_deps[override_key]
+                self.c_override_singletons.discard(override_key)
+        for k in [k for k, deps in self.c_known_deps.items() if any(_related(k2, dep) for k2 in keys for dep in deps)]:
+            del self.c_known_deps[k]
+        if not self.c_singleton_deps:
+            return
+        changed = list(keys)
+        while changed:
+            stale = [
+                k for k, deps in self.c_singleton_deps.items()
+                if any(_related(k2, dep) for k2 in changed for dep in deps)
+            ]
+            for k in stale:
+                del self.c_singleton_deps[k]
+                self.c_singletons.discard(k)
+            changed = stale
+
+    def release(self, k):
+        """Drops the singletons of `k` and its subkeys, which are created again on next access."""
+        self._bump([k])
+        for k2 in [k2 for k2 in self.c_known_deps if _related(k2, k)]:
+            del self.c_known_deps[k2]
+        for k2 in self.c_singletons.release(k):
+            self.c_singleton_deps.pop(k2, None)
+        for k2 in self.c_override_singletons.release(k):
+            self.c_override_deps.pop(k2, None)
+
+    def singleton_memory(self):
+        """{dotted key: estimated size in bytes} of the singletons currently held."""
+        return self.c_singletons.memory()
+
     def _get_python_ref(self, orig_val):
         if orig_val.endswith("()"):
             return import_python_object(orig_val[1:-2])() # import and call without overrides
@@ -355,63 +995,207 @@ class Conf:
             return import_python_object(orig_val[1:]) # just import
 
     def _get_python_ref_with_overrides(self, k, orig_val):
-        overrides = {}
-        for k2, v in orig_val.items():
-            if k2 != "_callable":
-                overrides[k2] = self._get_val(f"{k}.{k2}", v)
+        fn = import_python_object(orig_val["_callable"][1:-2])
+        arg_keys = {k2: f"{k}.{k2}" for k2 in orig_val if k2 not in ["_callable", "_cache"]}
+        for overrides_dict in self.overrides_dicts.get():
+            for k2 in overrides_dict:
+                # arguments which aren't in the definition, e.g. modified_conf(**{"encoder.num": 5})
+                if k2.startswith(f"{k}.") and "." not in k2[len(k) + 1:]:
+                    arg_keys.setdefault(k2[len(k) + 1:], k2)
+
+        cache_key = None
+        if orig_val.get("_cache"):
+            from confr.compiled import fingerprint
+
+            # the definition, the overrides of its arguments and the keys fn reads with confr.value
+            inputs = self.raw_deps([k] + self._bound_keys(fn, arg_keys))
+            cache_key = fingerprint([self._singleton_cache_key(k, orig_val), self.fingerprint_inputs(inputs)])
+            hit, singleton = self.singleton_cache.load(cache_key)
+            log.event("singleton_cache", key=k, cache_key=cache_key, hit=hit)
+            if hit:
+                if self.verbose:
+                    log.info("Loaded %s from the singleton cache.", k)
+                self._record_all(inputs)
+                return singleton
+
+        with self.recording() as deps:
+            kwargs = {
+                k2: self._get_val(k3, self._override_of(k3, orig_val[k2])) if k2 in orig_val else self.get(k3)
+                for k2, k3 in arg_keys.items()
+            }
+            singleton = fn(**kwargs)
+        if cache_key is not None:
+            if all(any(_related(dep, k2) for k2 in inputs) for dep in deps):
+                self.singleton_cache.save(cache_key, singleton)
+            else: # e.g. reads keys via another bound function, which aren't part of the cache key
+                log.warning("Not caching %s, since it depends on %s.", k, sorted(
+                    dep for dep in deps if not any(_related(dep, k2) for k2 in inputs)))
+        return singleton
+
+    def _bound_keys(self, fn, passed):
+        """Conf keys of the confr.value parameters of `fn` (if it's confr.bind-decorated) which
+        aren't in `passed`."""
+        binding = getattr(fn, "_confr_binding", None)
+        if binding is None:
+            return []
+        subkeys = interpolate_key(binding.subkeys, self)
+        return [binding.key(name, v, subkeys, self) for name, _, v in binding.params if name not in passed]
+
+    def _singleton_cache_key(self, k, orig_val):
+        """Fingerprint of a singleton's callable and arguments, with interpolations resolved to the
+        values they point to (as written in the conf, so that other singletons are identified by
+        their definitions)."""
+        from confr.compiled import fingerprint
+
+        def resolve(k, v, seen):
+            if _is_interpolation_val(v):
+                target = _interpolated_key(k, v)
+                assert target not in seen, f"Circular interpolation of {target}."
+                self._record(target)
+                return resolve(target, self._get_raw(target), seen | {target})
+            elif type(v) == dict:
+                return {
+                    k2: resolve(f"{k}.{k2}", self._override_of(f"{k}.{k2}", v2), seen)
+                    for k2, v2 in v.items()
+                }
+            else:
+                return v
 
-        return import_python_object(orig_val["_callable"][1:-2])(**overrides)
+        if type(orig_val) == dict:
+            orig_val = {k2: v for k2, v in orig_val.items() if k2 != "_cache"}
+        return fingerprint(resolve(k, orig_val, frozenset([k])))
 
     def add_overrides(self, overrides, verbose):
+        self._materialize()
         for arg_name, arg_val in overrides.items():
             if verbose:
-                print(f"    {arg_name} = {arg_val}")
+                log.info("    %s = %s", arg_name, arg_val)
             if self.c_original[arg_name] != arg_val:
                 if verbose:
-                    print(f"        value differs from existing conf ({self.c_original[arg_name]})")
+                    log.info("        value differs from existing conf (%s)", self.c_original[arg_name])
+                self.c_index.discard(arg_name)
                 self.c_original[arg_name] = arg_val
-
-    def to_dict(self, include_singletons=False):
-        """This implementation does not eagerly initialize singleton configs."""
-        active_conf = {}
-        active_conf.update(deepcopy(self.c_original))
+                self.c_index.add(arg_name, self.c_original, arg_name)
+                self._changed([arg_name])
+
+    def to_dict(self, include_singletons=False, limit_keys=None):
+        """This implementation does not eagerly initialize singleton configs. Arrays (see
+        confr.arrays) are returned as lists, e.g. for json.dumps."""
+        self._materialize()
+        overrides_dicts = self.overrides_dicts.get()
+        if limit_keys and not include_singletons and not overrides_dicts:
+            return self.c_index.with_keys(limit_keys)
+
+        active_conf = copy_tree(self.c_original, arrays_as_lists=True)
         if include_singletons:
-            recursive_merge(self.c_singletons, active_conf)
-        for overrides_dict in self.overrides_dicts.get():
-            recursive_merge(overrides_dict, active_conf)
+            deep_merge(self.c_singletons.to_dict(), active_conf)
+        for overrides_dict in overrides_dicts:
+            deep_merge(overrides_dict, active_conf)
+        if limit_keys:
+            active_conf = with_keys(active_conf, limit_keys)
         return active_conf
 
-    def validate_types(self):
-        for k, expected_type in flattened_items(self.types):
-            if _in(self.c_original, k):
-                v = _get(self.c_original, k)
-                assert expected_type == type(v), \
-                    f"Expected {k} type to be {expected_type}, got {type(v)} for value {v}."
-
-    def set_missing_types(self):
-        for k, v in flattened_items(self.c_original):
-            if not _in(self.types, k):
-                assert type(v) in settings.PRIMITIVE_TYPES, \
+    def flattened_items(self):
+        """Flattened (dotted_key, value) pairs of the active conf."""
+        self._materialize()
+        if self.overrides_dicts.get():
+            return flattened_items(self.to_dict())
+        return self.c_index.items()
+
+    def validate_types(self, prefix=None):
+        """Checks the types of values (in the subtree of `prefix`). Lists of keys with an array
+        type are converted to arrays (see confr.arrays)."""
+        if prefix is None:
+            types_items = list(self.key_types.items())
+        else:
+            types_items = [(k, self.key_types[k]) for k in self.c_index.keys(prefix) if k in self.key_types]
+        for k, expected_type in types_items:
+            if k in self.c_index:
+                v = self.c_index.get(k)
+                if isinstance(v, _Lazy):
+                    continue # validated once loaded
+                if type(expected_type) == arrays.ArrayType and type(v) == list:
+                    v = self._to_array(k, expected_type, v)
+                assert expected_type == arrays.type_of(v), \
+                    f"Expected {k} type to be {expected_type}, got {arrays.type_of(v)} for value {v}."
+
+    def _to_array(self, k, array_type, v):
+        try:
+            arr = array_type(v)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise AssertionError(f"Expected {k} type to be {array_type}, got {v} ({e}).")
+        parent, leaf = self.c_index.entries[k]
+        parent[leaf] = arr
+        return arr
+
+    def set_missing_types(self, prefix=None):
+        for k, v in self.c_index.items(prefix):
+            if isinstance(v, _Lazy):
+                continue # set once loaded
+            if k not in self.key_types:
+                assert type(v) in settings.PRIMITIVE_TYPES or type(v) == array.array, \
                     f"{type(v)} not in settings.PRIMITIVE_TYPES ({settings.PRIMITIVE_TYPES})"
-                _set(self.types, k, type(v))
+                self.key_types[k] = arrays.type_of(v) # keyed by the index's own key string
+
+    @property
+    def types(self):
+        """Nested dict of the types of all keys (built from `key_types`)."""
+        ret = {}
+        for k, t in self.key_types.items():
+            parts = k.split(".")
+            d = ret
+            for part in parts[:-1]:
+                if type(d.get(part)) != dict:
+                    d[part] = {}
+                d = d[part]
+            d[parts[-1]] = t
+        return ret
+
+    @types.setter
+    def types(self, types):
+        self.key_types = {}
+        self._set_types(None, types)
+
+    def _set_types(self, k, types):
+        """Sets the type of `k`, or with a dict of types, the types of its subkeys."""
+        if type(types) == dict:
+            self.key_types.update(flattened_items(types, prefix=k))
+        else:
+            self.key_types[k] = types
+
+    def get_type(self, k):
+        """Type of `k`, or a nested dict of the types of its subkeys."""
+        if k in self.key_types:
+            return self.key_types[k]
+        return _get(self.types, k)
 
     def maybe_override_plx(self):
+        keys = []
         for k, v in self.plx_inputs.items():
             k = k.replace(settings.PLX_DOT_REPLACEMENT, ".")
             v = None if v == "" else v
-            if _in(self.c_original, k):
+            self._materialize(k)
+            if k in self.c_index:
                 self.set(k, v)
+                keys.append(k)
+        if keys:
+            log.event("overrides", source="plx", keys=keys)
 
-    def conf_patches_overrides(self):
+    def conf_patches_overrides(self, cli=True):
         # Can add overrides from other systems than plx here as well.
-        plx_conf_patches = self.plx_inputs.get("conf_patches") or tuple()
-        cli_conf_patches = _get_cli_arg("-c", action="append") or tuple()
-        return tuple(plx_conf_patches) + tuple(cli_conf_patches)
+        plx_conf_patches = cli_conf_patches = None
+        if settings.IN_POLYAXON:
+            with self.profile.phase("plx"):
+                plx_conf_patches = self.plx_inputs.get("conf_patches")
+        if cli:
+            with self.profile.phase("cli"):
+                cli_conf_patches = _get_cli_arg("-c", action="append")
+        return tuple(plx_conf_patches or ()) + tuple(cli_conf_patches or ())
 
     @property
     def plx_inputs(self):
         if self._plx_inputs is None:
-            self._plx_inputs = plx.inputs()
+            self._plx_inputs = self.pipeline.result("plx", plx.inputs)
         return self._plx_inputs
 
 
@@ -427,8 +1211,12 @@ class ModifiedConf:
         self.overrides_dicts_before = self.global_conf.overrides_dicts.set(
             self.global_conf.overrides_dicts.get() + [self.overrides_dict]
         )
+        self.global_conf._bump(self.overrides_dict)
+        self.global_conf._notify(self.overrides_dict)
 
     def __exit__(self, *args):
         assert self.global_conf.overrides_dicts.get()[-1] == self.overrides_dict, \
             (self.global_conf.overrides_dicts.get()[-1], self.overrides_dict)
         self.global_conf.overrides_dicts.reset(self.overrides_dicts_before)
+        self.global_conf._bump(self.overrides_dict)
+        self.global_conf._notify(self.overrides_dict)
@@ -0,0 +1,71 @@
+"""Concurrent I/O stages of Conf.__init__.
+
+Reading conf files, looking up their types files, loading `_file` references and fetching
+Polyaxon inputs mostly wait on the file system or network. A Pipeline submits each of them to a
+small thread pool as soon as its input is known, while the main thread parses CLI args and
+merges the files read so far. Results are consumed in the same order as a sequential init would
+produce them, so the merged conf doesn't depend on which stage finishes first, and an error in a
+stage is raised (in the main thread) when its result is needed.
+"""
+import time
+
+
+class Stage:
+    __slots__ = ("fn", "args", "future", "value", "error", "duration")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.future = None
+        self.value = self.error = None
+        self.duration = 0.0
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.value = self.fn(*self.args)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.duration = time.perf_counter() - start
+
+
+class Pipeline:
+    def __init__(self, profile, concurrent=True, max_threads=8):
+        self.profile = profile # stage durations are recorded in profile.stages
+        self.concurrent = concurrent # if False, stages run when their result is needed
+        self.stages = {} # name -> started Stage whose result hasn't been consumed yet
+        self.max_threads = max_threads
+        self.executor = None # started with the first stage, shut down by clear
+
+    def start(self, name, fn, *args):
+        """Starts running `fn(*args)` in the background, unless stage `name` is running already."""
+        if not self.concurrent or name in self.stages:
+            return
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="confr")
+        stage = self.stages[name] = Stage(fn, args)
+        stage.future = self.executor.submit(stage.run)
+
+    def result(self, name, fn, *args):
+        """Result of stage `name` once it's finished, or of `fn(*args)` if it wasn't started."""
+        stage = self.stages.pop(name, None)
+        if stage is None:
+            stage = Stage(fn, args)
+            stage.run()
+        else:
+            stage.future.result()
+        self.profile.stages[name] = stage.duration
+        if stage.error is not None:
+            raise stage.error
+        return stage.value
+
+    def clear(self):
+        """Drops the results of stages which weren't consumed (e.g. references replaced by overrides),
+        and lets the pool's threads exit once they're done."""
+        self.stages.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -1,4 +1,5 @@
 from confr.settings import PLX_DOT_REPLACEMENT, IN_POLYAXON
+from confr import log
 
 
 def enc_input(input_name):
@@ -14,14 +15,14 @@ def dec_input(input_name):
 
 def inputs():
     if IN_POLYAXON:
-        print(f"Overriding arguments from Polyaxon since IN_POLYAXON={IN_POLYAXON}.")
+        log.info("Overriding arguments from Polyaxon since IN_POLYAXON=%s.", IN_POLYAXON)
         from polyaxon.client import RunClient
 
         try:
             run_client = RunClient()
             run_client.refresh_data()
         except:
-            print("Could not initialise RunClient. Polyaxon configured?")
+            log.warning("Could not initialise RunClient. Polyaxon configured?")
             return {}
         return run_client.get_inputs()
 
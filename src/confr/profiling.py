@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+
+
+import_time = None # seconds spent importing confr, set in confr/__init__.py
+
+
+class StartupProfile:
+    """Wall-clock time spent in each phase of Conf.__init__ (by the main thread), and in each of
+    its concurrent I/O stages (see confr.pipeline), e.g. "read config/_base"."""
+
+    PHASES = ("import", "parse", "merge", "refs", "types", "cli", "env", "plx")
+
+    def __init__(self):
+        self.timings = {phase: 0.0 for phase in self.PHASES}
+        self.stages = {} # stage name -> seconds, in the order their results were used
+        if import_time is not None:
+            self.timings["import"] = import_time
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    def report(self):
+        lines = ["confr startup profile:"]
+        for phase, duration in self.timings.items():
+            lines.append(f"    {phase:<8} {duration * 1000:8.2f} ms")
+        lines.append(f"    {'total':<8} {self.total * 1000:8.2f} ms")
+        if self.stages:
+            lines.append("  stages (concurrent):")
+            for stage, duration in self.stages.items():
+                lines.append(f"    {duration * 1000:8.2f} ms  {stage}")
+        return "\n".join(lines)
@@ -5,6 +5,16 @@ BASE_CONF = os.environ.get("CONFR_BASE_CONF", "_base")
 DOT_REPLACEMENT = os.environ.get("DOT_REPLACEMENT", "__")
 PLX_DOT_REPLACEMENT = os.environ.get("PLX_DOT_REPLACEMENT", "__")
 IN_POLYAXON = int(os.environ.get("IN_POLYAXON", 0))
+SINGLETON_CACHE_DIR = os.environ.get(
+    "CONFR_SINGLETON_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "confr", "singletons"),
+)
+HTTP_CACHE_DIR = os.environ.get(
+    "CONFR_HTTP_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "confr", "http"),
+)
+# confr settings, rather than env overrides
+ENV_SETTINGS = ("CONFR_CONF_DIR", "CONFR_BASE_CONF", "CONFR_SINGLETON_CACHE_DIR", "CONFR_HTTP_CACHE_DIR")
 
 
 PRIMITIVE_TYPES = [int, float, str, list, bool, type(None)]
@@ -13,4 +23,6 @@ STR_TO_TYPE = {
     "float": float,
     "str": str,
     "list": list,
+    "bool": bool,
+    "NoneType": type(None),
 }
@@ -0,0 +1,207 @@
+"""Storage of singletons: in memory (SingletonStore) and on disk (DiskCache).
+
+SingletonStore keeps the singletons created by a Conf, optionally bounded by the number of
+singletons and/or their estimated size in bytes, evicting the least recently used ones when
+either bound is exceeded. An evicted (or released) singleton is created again on next access, so
+objects which hold on to it (e.g. other singletons) may end up with a different instance.
+Keys (and their subkeys) in `weak_keys` are only held via weak references where possible, i.e.
+they're dropped once nothing outside of confr uses them.
+
+DiskCache stores singletons shared between processes. Singletons defined with `_cache: true`
+are stored under the fingerprint of their callable and (resolved) arguments (see
+Conf._singleton_cache_key), so any process with the same definition loads the stored object
+instead of creating it. NumPy arrays are stored as .npy files and loaded memory-mapped
+(read-only), everything else is pickled.
+
+Only the definition in the conf is hashed, so clear the cache dir when the code of a cached
+callable changes.
+"""
+import os
+import sys
+import weakref
+from collections import OrderedDict
+from types import ModuleType, FunctionType, BuiltinFunctionType
+
+from confr import log
+from confr.utils import atomic_open
+
+
+class SingletonStore:
+    def __init__(self, max_items=None, max_bytes=None, weak_keys=(), on_evict=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.weak_keys = tuple(weak_keys)
+        self.on_evict = on_evict # called with the key of every singleton evicted or collected
+        self.entries = OrderedDict() # dotted key -> object or weakref to it, least recently used first
+        self.sizes = {} # dotted key -> estimated size in bytes, computed on demand (see memory)
+        self.total_bytes = 0 # of the singletons in self.sizes
+
+    def __contains__(self, k):
+        return self._lookup(k) is not _MISSING
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, k):
+        obj = self._lookup(k)
+        if obj is _MISSING:
+            raise KeyError(k)
+        self.entries.move_to_end(k)
+        return obj
+
+    def _lookup(self, k):
+        entry = self.entries.get(k, _MISSING)
+        if type(entry) == weakref.ref:
+            entry = entry()
+            if entry is None: # collected
+                self.discard(k)
+                self._evicted(k)
+                return _MISSING
+        return entry
+
+    def set(self, k, obj):
+        self.discard(k)
+        if self.weak_keys and any(k == k2 or k.startswith(f"{k2}.") for k2 in self.weak_keys):
+            try:
+                self.entries[k] = weakref.ref(obj)
+            except TypeError: # e.g. ints, lists and dicts can't be weakly referenced
+                self.entries[k] = obj
+        else:
+            self.entries[k] = obj
+        if self.max_bytes is not None:
+            self._set_size(k, obj)
+        self._evict(keep=k)
+        return obj
+
+    def _set_size(self, k, obj):
+        self.sizes[k] = sizeof(obj)
+        self.total_bytes += self.sizes[k]
+
+    def discard(self, k):
+        self.entries.pop(k, None)
+        self.total_bytes -= self.sizes.pop(k, 0)
+
+    def release(self, k):
+        """Drops the singleton of `k` and all singletons below it. Returns the released keys."""
+        keys = [k2 for k2 in self.entries if k2 == k or k2.startswith(f"{k}.")]
+        for k2 in keys:
+            self.discard(k2)
+        return keys
+
+    def _evict(self, keep):
+        while self.max_items is not None and len(self.entries) > self.max_items:
+            self._evict_oldest(keep)
+        while self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._evict_oldest(keep)
+
+    def _evict_oldest(self, keep):
+        k = next(k for k in self.entries if k != keep)
+        log.debug("Evicting singleton %s.", k)
+        self.discard(k)
+        self._evicted(k)
+
+    def _evicted(self, k):
+        if self.on_evict is not None:
+            self.on_evict(k)
+
+    def memory(self):
+        """{dotted key: estimated size in bytes} of the stored singletons."""
+        ret = {}
+        for k in list(self.entries):
+            obj = self._lookup(k)
+            if obj is _MISSING:
+                continue
+            if k not in self.sizes:
+                self._set_size(k, obj)
+            ret[k] = self.sizes[k]
+        return ret
+
+    def items(self):
+        for k in list(self.entries):
+            obj = self._lookup(k)
+            if obj is not _MISSING:
+                yield k, obj
+
+    def to_dict(self):
+        """Nested dict of the stored singletons."""
+        ret = {}
+        for k, obj in self.items():
+            parts = k.split(".")
+            d = ret
+            for part in parts[:-1]:
+                d = d.setdefault(part, {})
+            d[parts[-1]] = obj
+        return ret
+
+
+_MISSING = object()
+
+
+def sizeof(obj):
+    """Estimated size of `obj` in bytes, including the objects it refers to.
+
+    Objects with an integer `nbytes` (e.g. NumPy arrays) count as `nbytes`, modules, classes
+    and functions aren't counted.
+    """
+    total = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, ModuleType, FunctionType, BuiltinFunctionType)):
+            continue
+        seen.add(id(o))
+        nbytes = getattr(o, "nbytes", None)
+        if type(nbytes) == int:
+            total += nbytes
+            continue
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        if hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return total
+
+
+class DiskCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def load(self, key):
+        """Returns (True, obj) if `key` is cached, (False, None) otherwise."""
+        fp = os.path.join(self.cache_dir, key)
+        if os.path.exists(f"{fp}.npy"):
+            import numpy as np
+            return True, np.load(f"{fp}.npy", mmap_mode="r")
+        elif os.path.exists(f"{fp}.pkl"):
+            import pickle
+            with open(f"{fp}.pkl", "rb") as f:
+                return True, pickle.load(f)
+        return False, None
+
+    def save(self, key, obj):
+        """Stores `obj` under `key`, unless it can't be pickled."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fp = os.path.join(self.cache_dir, key)
+        if _is_ndarray(obj) and not obj.dtype.hasobject:
+            import numpy as np
+            with atomic_open(f"{fp}.npy", "wb") as f:
+                np.save(f, obj, allow_pickle=False)
+            return
+
+        import pickle
+        try:
+            data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            log.warning("Not caching %s, it can't be pickled (%s).", key, e)
+            return
+        with atomic_open(f"{fp}.pkl", "wb") as f:
+            f.write(data)
+
+
+def _is_ndarray(obj):
+    # checked without importing numpy, which is only needed if numpy arrays are being cached
+    return type(obj).__module__ == "numpy" and type(obj).__name__ in ["ndarray", "memmap"]
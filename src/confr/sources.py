@@ -0,0 +1,231 @@
+"""Where conf files are read from: local paths, or URLs (e.g. `http://host/conf/_base.yaml`).
+
+Sources are registered per URL scheme (see register_source), locations without a registered
+scheme are local paths. A source implements `open(location, mode)` (returning a file-like
+object) and `exists(location)`, and must be thread-safe, since Conf.__init__ reads files
+concurrently (see confr.pipeline).
+
+HTTPSource keeps idle connections open for reuse (per host), and stores fetched files in a
+cache dir along with their ETag / Last-Modified headers. Cached files are revalidated with a
+conditional request (a cheap 304 response if they're unchanged), or not at all while they're
+fresh, i.e. for `max_age` seconds or the max-age sent by the server.
+"""
+import io
+import os
+import time
+import threading
+
+from confr import settings, log
+
+
+def is_url(location):
+    return "://" in location
+
+
+def join(conf_dir, fn):
+    """Location of `fn` relative to `conf_dir` (a dir or a URL), unless `fn` is absolute."""
+    if is_url(fn) or os.path.isabs(fn):
+        return fn
+    if is_url(conf_dir):
+        from urllib.parse import urljoin
+        return urljoin(conf_dir.rstrip("/") + "/", fn)
+    return os.path.join(conf_dir, fn)
+
+
+def source_of(location):
+    scheme, sep, _ = location.partition("://")
+    if sep and scheme in sources:
+        return sources[scheme]
+    return local
+
+
+def open_location(location, mode="r"):
+    return source_of(location).open(location, mode)
+
+
+def exists(location):
+    return source_of(location).exists(location)
+
+
+def register_source(scheme, source):
+    """Reads locations starting with `{scheme}://` from `source`."""
+    sources[scheme] = source
+
+
+class LocalSource:
+    def open(self, location, mode="r"):
+        return open(location, mode)
+
+    def exists(self, location):
+        return os.path.exists(location)
+
+
+class HTTPSource:
+    def __init__(self, cache_dir=settings.HTTP_CACHE_DIR, max_age=0, headers=None, timeout=30, max_idle=8):
+        self.cache_dir = cache_dir # None disables the on-disk cache
+        self.max_age = max_age # seconds a fetched file is used without revalidating it
+        self.headers = headers or {} # sent with every request, e.g. for authentication
+        self.timeout = timeout
+        self.max_idle = max_idle # idle connections kept open per host
+        self.idle = {} # (scheme, host) -> connections ready for reuse
+        self.fetched = {} # url -> bytes fetched by exists(url), for the following open(url)
+        self.lock = threading.Lock()
+
+    def open(self, location, mode="r"):
+        data = self.fetch(location)
+        return io.BytesIO(data) if "b" in mode else io.StringIO(data.decode("utf-8"))
+
+    def exists(self, location):
+        try:
+            data = self.fetch(location)
+        except (FileNotFoundError, PermissionError):
+            # e.g. S3 responds to requests for missing objects with 403 unless listing is allowed
+            return False
+        with self.lock:
+            self.fetched[location] = data # for the open() which usually follows
+        return True
+
+    def fetch(self, url):
+        """Contents of `url`, from the cache if it's unchanged."""
+        with self.lock:
+            data = self.fetched.pop(url, None)
+        if data is not None:
+            return data
+
+        meta, data = self._load_cached(url)
+        if data is not None and meta.get("expires", 0) > time.time():
+            log.debug("Using cached %s.", url)
+            return data
+
+        headers = dict(self.headers)
+        if data is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if data is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        status, resp_headers, body = self._request(url, headers)
+        log.event("fetch", url=url, status=status)
+
+        if status == 304 and data is not None:
+            log.debug("Cached %s is up to date.", url)
+            fresh_meta = {k: v for k, v in self._cache_meta(resp_headers).items() if v is not None}
+            self._save_cached(url, {**meta, **fresh_meta}, None)
+            return data
+        if status in [404, 410]:
+            raise FileNotFoundError(f"{url} not found (HTTP {status}).")
+        if status == 403:
+            raise PermissionError(f"Fetching {url} is forbidden (HTTP 403).")
+        if status != 200:
+            raise Exception(f"Fetching {url} failed with HTTP {status}.")
+        self._save_cached(url, self._cache_meta(resp_headers), body)
+        return body
+
+    def _request(self, url, headers):
+        """(status, headers, body) of a GET request to `url`, sent over a pooled connection."""
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        pool_key = (parts.scheme, parts.netloc)
+        with self.lock:
+            conns = self.idle.get(pool_key)
+            conn = conns.pop() if conns else None
+        reused = conn is not None
+        if conn is None:
+            conn = self._connect(parts.scheme, parts.netloc)
+
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (ConnectionError, OSError) as e:
+            conn.close()
+            if not reused:
+                raise
+            # the server closed the idle connection, retry with a new one
+            log.debug("Reconnecting to %s (%s).", parts.netloc, e)
+            with self.lock:
+                stale = self.idle.pop(pool_key, [])
+            for conn in stale:
+                conn.close()
+            return self._request(url, headers)
+
+        if resp.will_close:
+            conn.close()
+        else:
+            with self.lock:
+                conns = self.idle.setdefault(pool_key, [])
+                if len(conns) < self.max_idle:
+                    conns.append(conn)
+                else:
+                    conn.close()
+        return resp.status, {k.lower(): v for k, v in resp.getheaders()}, body
+
+    def _connect(self, scheme, netloc):
+        import http.client
+
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def close(self):
+        """Closes the idle connections."""
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _cache_meta(self, headers):
+        max_age = self.max_age
+        cache_control = headers.get("cache-control", "")
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            max_age = 0
+        else:
+            for directive in cache_control.split(","):
+                name, _, value = directive.strip().partition("=")
+                if name == "max-age" and value.isdigit():
+                    max_age = max(max_age, int(value))
+        return dict(
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            expires=time.time() + max_age,
+        )
+
+    def _cache_fp(self, url):
+        import hashlib
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _load_cached(self, url):
+        """(metadata, contents) of `url` in the cache, or ({}, None)."""
+        if self.cache_dir is None:
+            return {}, None
+        import json
+
+        fp = self._cache_fp(url)
+        try:
+            with open(f"{fp}.json") as f:
+                meta = json.load(f)
+            with open(f"{fp}.body", "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return {}, None
+
+    def _save_cached(self, url, meta, data):
+        """Stores `data` (unless None, i.e. unchanged) and `meta` of `url` in the cache."""
+        if self.cache_dir is None:
+            return
+        import json
+        from confr.utils import atomic_open
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fp = self._cache_fp(url)
+        if data is not None:
+            with atomic_open(f"{fp}.body", "wb") as f:
+                f.write(data)
+        with atomic_open(f"{fp}.json", "w") as f:
+            json.dump({"url": url, **meta}, f)
+
+
+local = LocalSource()
+http_source = HTTPSource()
+sources = {"http": http_source, "https": http_source} # url scheme -> source
@@ -0,0 +1,23 @@
+import confr
+
+
+calls = []
+
+
+def helper(batch_size):
+    # not a validator, even though it's a callable in this module
+    calls.append("helper")
+    return batch_size > 0
+
+
+@confr.validator
+@confr.bind
+def validate_batch_size(batch_size=confr.value):
+    calls.append("validate_batch_size")
+    assert helper(batch_size)
+
+
+@confr.validator(keys=["lr"])
+def validate_lr():
+    calls.append("validate_lr")
+    assert confr.get("lr") < 1.0
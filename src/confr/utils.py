@@ -1,10 +1,13 @@
+import os
 import sys
+import array
 import importlib
-import re
-import yaml
-from yaml import SafeDumper
+import functools
+import contextlib
+from copy import deepcopy
 
-from confr import settings
+from confr import settings, log, sources
+from confr.views import FrozenList, FrozenDict, ConfView
 
 
 def import_python_object(module_path_and_var_name):
@@ -19,20 +22,122 @@ def import_python_object(module_path_and_var_name):
 
 def read_yaml(fn, verbose=True):
     if verbose:
-        print(f"Reading {fn}.")
-    with open(fn, 'r') as f:
-        return yaml.safe_load(f)
+        log.info("Reading %s.", fn)
+    ret = load_yaml(fn)
+    log.event("load", fp=fn)
+    return ret
+
+
+def load_yaml(fn):
+    import yaml
+
+    with sources.open_location(fn, 'r') as f:
+        return yaml.load(f, Loader=_conf_loader())
+
+
+@functools.lru_cache(maxsize=None)
+def _conf_loader():
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError: # PyYAML built without libyaml
+        from yaml import SafeLoader
+    return SafeLoader
+
+
+class _StrippedDict:
+    """Read-only view of a (nested) dict without `except_keys`, used to dump a conf without copying it."""
+
+    __slots__ = ("d", "except_keys", "key_prefix")
+
+    def __init__(self, d, except_keys, key_prefix=None):
+        self.d = d
+        self.except_keys = except_keys
+        self.key_prefix = key_prefix
+
+    def items(self):
+        for k, v in self.d.items():
+            k_with_prefix = f"{self.key_prefix}.{k}" if self.key_prefix else k
+            if k_with_prefix in self.except_keys:
+                continue
+            if type(v) == dict:
+                v = _StrippedDict(v, self.except_keys, key_prefix=k_with_prefix)
+            yield k, v
+
+
+@functools.lru_cache(maxsize=None)
+def _conf_dumper():
+    try:
+        from yaml import CSafeDumper as SafeDumper
+    except ImportError: # PyYAML built without libyaml
+        from yaml import SafeDumper
+
+    class ConfDumper(SafeDumper):
+        pass
+
+    ConfDumper.add_representer(_StrippedDict, lambda dumper, data: dumper.represent_dict(data))
+    ConfDumper.add_representer(array.array, lambda dumper, data: dumper.represent_list(data.tolist()))
+    ConfDumper.add_representer(FrozenList, lambda dumper, data: dumper.represent_list(data))
+    ConfDumper.add_representer(FrozenDict, lambda dumper, data: dumper.represent_dict(data))
+    return ConfDumper
 
 
-def write_yaml(fn, obj, verbose=True, do_print=False):
+@functools.lru_cache(maxsize=None)
+def register_yaml_representers():
+    """Lets yaml's dumpers (e.g. yaml.safe_dump) write the read-only lists and dicts that get returns."""
+    import yaml
+
+    dumpers = [yaml.SafeDumper, yaml.Dumper]
+    dumpers += [getattr(yaml, name) for name in ["CSafeDumper", "CDumper"] if hasattr(yaml, name)] # built with libyaml
+    for dumper in dumpers:
+        dumper.add_representer(FrozenList, lambda dumper, data: dumper.represent_list(data))
+        dumper.add_representer(FrozenDict, lambda dumper, data: dumper.represent_dict(data))
+
+
+def write_yaml(fn, obj, verbose=True, do_print=False, except_keys=()):
+    """Writes `obj` (without `except_keys`) to `fn` atomically, i.e. `fn` is never left half-written."""
+    import yaml
+
     if verbose:
-        print(f"Writing {fn}.")
-    with open(fn, 'w') as f:
-        yaml.dump(obj, f, allow_unicode=True, sort_keys=False, Dumper=SafeDumper)
-        if do_print:
-            print("---")
-            yaml.dump(obj, sys.stdout, allow_unicode=True, sort_keys=False, Dumper=SafeDumper)
-            print("---")
+        log.info("Writing %s.", fn)
+    log.event("write", fp=fn)
+    if type(obj) == dict:
+        obj = _StrippedDict(obj, frozenset(except_keys))
+
+    with atomic_open(fn, 'w') as f:
+        yaml.dump(obj, f, allow_unicode=True, sort_keys=False, Dumper=_conf_dumper())
+
+    if do_print:
+        print("---")
+        with open(fn, 'r') as f:
+            sys.stdout.write(f.read())
+        print("---")
+
+
+@contextlib.contextmanager
+def atomic_open(fn, mode='w'):
+    """Opens a temp file next to `fn`, which is renamed to `fn` once the block exits without errors."""
+    import tempfile
+
+    dir_name, base_name = os.path.split(os.path.abspath(fn))
+    fd, tmp_fn = tempfile.mkstemp(prefix=f".{base_name}.", suffix=".tmp", dir=dir_name)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.chmod(tmp_fn, _file_mode(fn)) # mkstemp creates files readable only by their owner
+        os.replace(tmp_fn, fn)
+    except BaseException:
+        os.remove(tmp_fn)
+        raise
+
+
+def _file_mode(fn):
+    """Mode of the existing `fn`, or the mode `open` would create it with."""
+    try:
+        return os.stat(fn).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 def strip_keys(conf_dict, except_keys=[], key_prefix=None):
@@ -72,6 +177,8 @@ def flattened_items(conf_dict, prefix=None):
 
 def interpolate_key(k, conf):
     if k:
+        import re
+
         regex = r"\$\{(.*?)\}"
         for match in re.finditer(regex, k, re.DOTALL):
             outer = match.group(0) # e.g. ${key.subkey}
@@ -82,18 +189,104 @@ def interpolate_key(k, conf):
     return k
 
 
-def recursive_merge(src, dst):
-    for k, v in src.items():
-        if type(v) == dict:
-            if k in dst:
-                if type(src[k]) == dict and type(dst[k]) == dict:
-                    recursive_merge(src[k], dst[k])
-                else:
-                    dst[k] = v # overwrite, shouldn't happen usually
+def intern_keys(v):
+    """Replaces the str keys of all dicts in `v` with interned strings, so that e.g. a key repeated
+    in 10k generated sections is stored once rather than 10k times. Returns `v`."""
+    stack = [v]
+    while stack:
+        node = stack.pop()
+        if type(node) == dict:
+            items = list(node.items())
+            node.clear()
+            for k, v2 in items:
+                node[sys.intern(k) if type(k) == str else k] = v2
+            stack.extend(v2 for _, v2 in items if type(v2) in [dict, list])
+        elif type(node) == list:
+            stack.extend(v2 for v2 in node if type(v2) in [dict, list])
+    return v
+
+
+def copy_tree(v, copy_leaves=True, arrays_as_lists=False):
+    """Like deepcopy(v), but faster and leaner for conf trees: dicts and lists are copied without
+    recursion (so deep trees don't hit the recursion limit), primitive leaves are shared rather
+    than memoized, and only other leaves (e.g. arrays) are deep-copied, or with copy_leaves=False
+    shared as well. With arrays_as_lists=True, arrays (see confr.arrays) are copied as lists.
+    Read-only views of dicts and lists returned by `get` (see confr.views) are copied as plain
+    dicts and lists (ConfViews as the dicts they view, unresolved). Unlike with deepcopy, a dict
+    or list referenced twice (e.g. via a YAML anchor) is copied twice."""
+    if type(v) == ConfView:
+        v = v.raw
+    if type(v) not in _CONTAINERS:
+        if arrays_as_lists and type(v) == array.array:
+            return v.tolist()
+        return v if not copy_leaves or type(v) in _IMMUTABLE else deepcopy(v)
+    ret = _CONTAINERS[type(v)]()
+    stack = [(v, ret)]
+    while stack:
+        src, dst = stack.pop()
+        for k, v2 in (src.items() if type(dst) == dict else enumerate(src)):
+            if type(v2) == ConfView:
+                v2 = v2.raw
+            if type(v2) in _CONTAINERS:
+                v2_copy = _CONTAINERS[type(v2)]()
+                stack.append((v2, v2_copy))
+            elif type(v2) in _IMMUTABLE or not copy_leaves and not arrays_as_lists:
+                v2_copy = v2
+            elif arrays_as_lists and type(v2) == array.array:
+                v2_copy = v2.tolist()
             else:
-                dst[k] = v # set in dst for first time
-        else:
-            dst[k] = v # primitive, OK to blindly overwrite
+                v2_copy = deepcopy(v2) if copy_leaves else v2
+            if type(dst) == dict:
+                dst[k] = v2_copy
+            else:
+                dst.append(v2_copy)
+    return ret
+
+
+_CONTAINERS = {dict: dict, list: list, FrozenDict: dict, FrozenList: list} # type -> type of its copy
+_IMMUTABLE = frozenset([str, int, float, bool, type(None)])
+
+
+def deep_merge(src, dst, index=None, key=None):
+    """Merges dict `src` into dict `dst`, in place. Dicts in `src` are merged into the dicts at the
+    same keys of `dst`, other values replace the values in `dst`, as do dicts whose key ends with
+    "=" (the override marker, which is removed from the key).
+
+    Uses an explicit stack, so deep trees don't hit the recursion limit. Dicts and lists taken
+    from `src` are copied (other values are shared), so `dst` never aliases `src`: setting a key
+    in one later doesn't modify the other. Only the keys in `src` are visited, so the cost is
+    linear in the size of `src`. If `index` (a KeyIndex containing `dst`, at dotted key `key`,
+    or None for its root) is given, it's kept up to date.
+    """
+    stack = [(src, dst, key, None, None)] # (src dict, dst dict, its key, its parent and leaf in dst)
+    while stack:
+        src_node, dst_node, key, parent, leaf = stack.pop()
+        if parent is not None and parent.get(leaf) is not dst_node:
+            continue # replaced since, e.g. by "k=" after "k" in the same dict
+        for k, v in src_node.items():
+            override = type(k) == str and k.endswith("=")
+            if override:
+                k = k[:-1]
+            k_full = None if index is None else k if key is None else f"{key}.{k}"
+            if type(v) == ConfView:
+                v = v.raw
+            if type(v) in [dict, FrozenDict] and not override:
+                if type(dst_node.get(k)) == dict:
+                    stack.append((v, dst_node[k], k_full, dst_node, k))
+                    continue
+                v_copy = {} # filled in when popped from the stack, indexed as it's filled
+                stack.append((v, v_copy, k_full, dst_node, k))
+            else:
+                v_copy = copy_tree(v, copy_leaves=False)
+            if index is not None:
+                index.discard(k_full)
+            dst_node[k] = v_copy
+            if index is not None:
+                index.add(k_full, dst_node, k)
+    return dst
+
+
+recursive_merge = deep_merge # former name
 
 
 def escape(s):
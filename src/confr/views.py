@@ -0,0 +1,101 @@
+"""Read-only views of resolved conf values, which can be cached and shared between callers."""
+from collections.abc import Mapping
+
+
+class FrozenList(list):
+    """A list which can't be modified (use `list(frozen_list)` for a modifiable copy)."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Resolved conf lists are read-only, use list(value) to get a copy.")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+    def __reduce__(self):
+        # pickle and deepcopy would otherwise rebuild it with `extend`
+        return FrozenList, (list(self),)
+
+
+class FrozenDict(dict):
+    """A dict which can't be modified (use `dict(frozen_dict)` for a modifiable copy)."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Resolved conf dicts are read-only, use dict(value) to get a copy.")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(v):
+    """`v` with all lists and dicts in it replaced by read-only copies."""
+    if type(v) == list:
+        return FrozenList(freeze(v2) for v2 in v)
+    elif type(v) == dict:
+        return FrozenDict({k: freeze(v2) for k, v2 in v.items()})
+    else:
+        return v
+
+
+class ConfView(Mapping):
+    """Read-only view of the dict `raw` at key `k` of a Conf, which resolves each child (e.g. its
+    interpolations and references) on first access, like `conf.get(f"{k}.{child}")` would.
+
+    Children are resolved with the overrides which were active when the view was created, and
+    cached, so a view doesn't reflect changes made to the conf after a child was first read.
+    Use `to_dict()` for a (fully resolved) dict, e.g. for json.dumps, which can't serialize a view.
+    Copying or pickling a view (e.g. sending it to a multiprocessing worker) gives such a dict.
+    """
+
+    __slots__ = ("conf", "k", "raw", "overrides_dicts", "resolved")
+
+    def __init__(self, conf, k, raw):
+        self.conf = conf
+        self.k = k
+        self.raw = raw
+        self.overrides_dicts = conf.overrides_dicts.get()
+        self.resolved = {}
+
+    def __getitem__(self, k2):
+        if k2 in self.resolved:
+            return self.resolved[k2]
+        if k2 not in self.raw:
+            raise KeyError(k2)
+        conf, k = self.conf, f"{self.k}.{k2}"
+        token = conf.overrides_dicts.set(self.overrides_dicts)
+        try:
+            conf._materialize(k)
+            conf._record(k)
+            # resolved from this view's dict (which may be an override of the whole dict), unless
+            # the child itself is overridden
+            v = self.resolved[k2] = conf._get_val(k, conf._override_of(k, self.raw[k2]))
+        finally:
+            conf.overrides_dicts.reset(token)
+        return v
+
+    def __contains__(self, k2):
+        return k2 in self.raw # without resolving it
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __repr__(self):
+        return f"ConfView({self.k!r}, {dict(self.items())!r})"
+
+    def __reduce__(self):
+        return dict, (self.to_dict(),)
+
+    def __deepcopy__(self, memo):
+        from copy import deepcopy
+        return deepcopy(self.to_dict(), memo)
+
+    def to_dict(self):
+        return {
+            k2: v.to_dict() if isinstance(v, ConfView) else v
+            for k2, v in self.items()
+        }
@@ -0,0 +1,61 @@
+import json
+import array
+
+import pytest
+
+import confr
+from confr.arrays import ArrayType, parse_type
+from confr.utils import read_yaml
+
+
+@confr.bind
+def weighted(weights=confr.value):
+    return weights
+
+
+def test_arrays(tmp_path):
+    confr.init(
+        conf={"weights": [1, 0.5, 2], "anchors": [[1, 2], [3, 4]], "buckets": [0, 10, 100]},
+        types={"weights": "array[float32]", "buckets": "array[int64]"},
+        cli_overrides=False,
+    )
+    stored = confr.get_global_conf().c_index.get("weights")
+    assert type(stored) == array.array and stored.typecode == "f"
+    assert confr.types()["weights"] == ArrayType("float32")
+
+    weights = weighted()
+    assert weights.tolist() == [1.0, 0.5, 2.0]
+    assert weights.readonly and weights.obj is stored # a view, not a copy
+    with pytest.raises(TypeError):
+        weights[0] = 3.0
+    assert list(confr.get("buckets")) == [0, 10, 100]
+    assert confr.get("anchors") == [[1, 2], [3, 4]] # untyped lists are unchanged
+
+    with confr.modified_conf(weights=[3, 4]):
+        assert weighted().tolist() == [3.0, 4.0]
+    confr.update({"buckets": [1, 2]})
+    assert type(confr.get_global_conf().c_index.get("buckets")) == array.array
+    with pytest.raises(AssertionError):
+        confr.update({"buckets": [1, "x"]})
+    assert list(confr.get("buckets")) == [1, 2]
+
+    assert json.loads(json.dumps(confr.to_dict()))["weights"] == [1.0, 0.5, 2.0]
+    assert confr.to_dict("buckets") == {"buckets": [1, 2]}
+
+    confr.write_conf(str(tmp_path / "conf.yaml"))
+    assert read_yaml(str(tmp_path / "conf.yaml"), verbose=False)["weights"] == [1.0, 0.5, 2.0]
+    confr.write_conf(str(tmp_path / "compiled.yaml"), resolved=True)
+    confr.init(compiled=str(tmp_path / "compiled.yaml"), cli_overrides=False)
+    assert confr.types()["buckets"] == ArrayType("int64")
+    assert confr.get("weights").tolist() == [1.0, 0.5, 2.0]
+
+
+def test_array_type():
+    assert parse_type("array[uint8]") == ArrayType("uint8")
+    assert parse_type("int") == int
+    assert ArrayType("int32")("[1, 2,3]") == array.array("i", [1, 2, 3])
+    assert ArrayType("float64")("0.5,1") == array.array("d", [0.5, 1.0])
+    with pytest.raises(OverflowError):
+        ArrayType("uint8")([256])
+    with pytest.raises(AssertionError):
+        parse_type("array[float16]")
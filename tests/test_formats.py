@@ -0,0 +1,58 @@
+import json
+import pickle
+
+import pytest
+
+from confr import formats
+from confr.models import Conf
+
+
+def _write(fp, s):
+    with open(fp, "w") as f:
+        f.write(s)
+
+
+def test_formats(tmp_path):
+    _write(tmp_path / "_base.json", json.dumps({
+        "lr": 0.1,
+        "model": {"_file": "model"},
+        "vocab": {"_file": "vocab.pkl"}, # pickles aren't resolved without their extension
+    }))
+    _write(tmp_path / "_base_types.json", json.dumps({"lr": "float"}))
+    _write(tmp_path / "model.toml", 'layers = 3\n[encoder]\ndim = 16\n')
+    _write(tmp_path / "model_types.yaml", "layers: int\n")
+    with open(tmp_path / "vocab.pkl", "wb") as f:
+        pickle.dump({"words": ["a", "b"]}, f)
+    _write(tmp_path / "fast.py", "import os\n\nconf = {'lr': 0.2, 'batch_size': 8}\n")
+    _write(tmp_path / "slow.py", "import os\n\nlr = 0.01\n_private = 1\n\ndef fn():\n    pass\n")
+
+    kwargs = dict(conf_dir=str(tmp_path), verbose=False, cli_overrides=False, env_overrides=False)
+    conf = Conf(**kwargs)
+    assert conf.get("lr") == 0.1
+    assert conf.get("model.layers") == 3
+    assert conf.get("model.encoder.dim") == 16
+    assert conf.get("vocab.words") == ["a", "b"]
+    assert conf.types["lr"] == float
+    assert conf.types["model"]["layers"] == int
+
+    conf = Conf(conf_patches=["fast.py"], **kwargs)
+    assert conf.get("lr") == 0.2
+    assert conf.get("batch_size") == 8
+    assert conf.get("model.encoder.dim") == 16
+
+    assert formats.load(str(tmp_path / "slow.py"), verbose=False) == {"lr": 0.01}
+
+
+def test_resolve(tmp_path):
+    _write(tmp_path / "a.json", "{}")
+    _write(tmp_path / "a.yaml", "")
+    _write(tmp_path / "b.v2", "")
+    assert formats.resolve(str(tmp_path / "a")) == str(tmp_path / "a.yaml")
+    assert formats.resolve(str(tmp_path / "a.json")) == str(tmp_path / "a.json")
+    assert formats.resolve(str(tmp_path / "b.v2")) == str(tmp_path / "b.v2")
+    assert formats.resolve(str(tmp_path / "c")) == str(tmp_path / "c.yaml")
+    _write(tmp_path / "d.pkl", "")
+    assert formats.resolve(str(tmp_path / "d")) == str(tmp_path / "d.yaml") # not d.pkl
+    with pytest.raises(AssertionError):
+        formats.load_pickle("http://example.com/conf.pkl")
+    assert formats.types_fps("conf/model.json") == ["conf/model_types.json", "conf/model_types.yaml"]
@@ -0,0 +1,121 @@
+from copy import deepcopy
+
+from confr.index import KeyIndex
+from confr.models import _set
+from confr.utils import flattened_items, with_keys
+
+
+def _all_keys(d, prefix=None):
+    for k, v in d.items():
+        k = k if prefix is None else f"{prefix}.{k}"
+        yield k
+        if type(v) == dict:
+            yield from _all_keys(v, prefix=k)
+
+
+def _assert_consistent(index, d):
+    assert set(index.entries) == set(_all_keys(d)), (set(index.entries), set(_all_keys(d)))
+    assert dict(index.items()) == dict(flattened_items(d))
+    for k in index.entries:
+        parent, leaf = index.entries[k]
+        assert parent[leaf] is index.get(k)
+
+
+def test_index_build():
+    d = {"k1": "v1", "k2": {"k3": "v3", "k4": {"k5": 5}}, "k6": {}}
+    index = KeyIndex(d)
+    _assert_consistent(index, d)
+    assert "k2.k4" in index
+    assert "k2.k4.k5" in index
+    assert "k2.k7" not in index
+    assert index.get("k2.k4.k5") == 5
+    assert index.get("k2.k7") is None
+
+
+def test_index_set():
+    d = {}
+    index = KeyIndex(d)
+
+    _set(d, "k1", "v1", index=index)
+    _set(d, "k2.k3.k4", "v4", index=index)
+    _assert_consistent(index, d)
+
+    _set(d, "k2", {"k3": {"k5": "v5"}, "k6": {"k7": "v7"}}, index=index)
+    _assert_consistent(index, d)
+    assert index.get("k2.k3.k4") == "v4"
+
+    _set(d, "k2", {"k3=": {"k8": "v8"}}, index=index)
+    _assert_consistent(index, d)
+    assert "k2.k3.k4" not in index
+
+    _set(d, "k2", "v2", index=index)
+    _assert_consistent(index, d)
+    assert "k2.k6.k7" not in index
+
+    _set(d, "k2", {"k13": {"k14": "v14"}}, index=index) # merging a dict into a leaf replaces it
+    _assert_consistent(index, d)
+    assert index.get("k2.k13.k14") == "v14"
+
+    _set(d, "k2", {"k15": {"k16": "v16"}, "k15=": 0, "k13": {"k17": 1}, "k13=": 1}, index=index)
+    _assert_consistent(index, d)
+    assert d["k2"] == {"k13": 1, "k15": 0}
+
+    _set(d, "k9", {"k10": {"k11": "v11"}}, merge_mode="override", index=index)
+    _set(d, "k9=", {"k12": "v12"}, index=index)
+    _assert_consistent(index, d)
+    assert d["k9"] == {"k12": "v12"}
+
+
+def test_index_with_keys():
+    d = {
+        "k1": {"k2": {"k3": "v3", "k4": "v4"}, "k5": "v5"},
+        "k6": "v6",
+    }
+    index = KeyIndex(d)
+    for limit_keys in [
+        ["k1"],
+        ["k6"],
+        ["k1.k2.k3"],
+        ["k1", "k1.k5"],
+        ["k1.k2", "k6", "unknown"],
+        ["unknown"],
+    ]:
+        expected = with_keys(deepcopy(d), limit_keys)
+        assert index.with_keys(limit_keys) == expected, (limit_keys, expected)
+
+
+def test_index_match():
+    d = {
+        "model": {
+            "encoder": {"lr": 0.1, "layers": 2},
+            "decoder": {"lr": 0.2, "layers": {"n": 3}},
+            "learning_rate": 0.01,
+        },
+        "opt": {"learning_rate": 0.001},
+        "learning_rate": 0.5,
+    }
+    index = KeyIndex(d)
+    _set(d, "extra.nested.learning_rate", 1.0, index=index)
+
+    def match(pattern):
+        return sorted(index.match(pattern))
+
+    assert match("model.encoder.*") == ["model.encoder.layers", "model.encoder.lr"]
+    assert match("model.*.lr") == ["model.decoder.lr", "model.encoder.lr"]
+    assert match("*.learning_rate") == ["model.learning_rate", "opt.learning_rate"]
+    assert match("**.learning_rate") == [
+        "extra.nested.learning_rate", "learning_rate", "model.learning_rate", "opt.learning_rate",
+    ]
+    assert match("model.**") == [
+        "model.decoder", "model.decoder.layers", "model.decoder.layers.n", "model.decoder.lr",
+        "model.encoder", "model.encoder.layers", "model.encoder.lr", "model.learning_rate",
+    ]
+    assert match("model.**.n") == ["model.decoder.layers.n"]
+    assert match("model.*coder") == ["model.decoder", "model.encoder"]
+    assert match("model.unknown.*") == []
+    assert match("learning_rate") == ["learning_rate"]
+
+    _set(d, "opt", "sgd", index=index)
+    assert match("**.learning_rate") == [
+        "extra.nested.learning_rate", "learning_rate", "model.learning_rate",
+    ]
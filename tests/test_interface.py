@@ -1,10 +1,20 @@
 # %%
+import gc
 import os
+import sys
+import json
+import pickle
+import weakref
+import subprocess
 from copy import deepcopy
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
+import pytest
+import yaml
+
 import confr
 from confr import settings
+from confr.models import Conf
 from confr.utils import read_yaml, write_yaml
 
 
@@ -692,6 +702,10 @@ def test_write_conf():
         confr.write_conf(conf_fn, except_keys=["key3.key4", "key3.key5"])
         assert read_yaml(conf_fn) == {"key1": "val1", "key2": "val2", "key3": {}}
 
+        with confr.modified_conf(key1="modified"):
+            confr.write_conf(conf_fn, except_keys=["key3"])
+            assert read_yaml(conf_fn) == {"key1": "modified", "key2": "val2"}
+
 
 def test_write_conf_with_interpolations():
     with TemporaryDirectory() as tmp_dir:
@@ -745,3 +759,517 @@ def test_to_dict():
 
 
 # %%
+
+
+def test_select():
+    conf = {
+        "lr": 0.5,
+        "model": {
+            "encoder": {"lr": 0.1, "layers": [1, 2]},
+            "decoder": {"lr": "${lr}"},
+        },
+    }
+    confr.init(conf=conf, cli_overrides=False)
+
+    assert confr.select("model.*.lr") == {"model.encoder.lr": 0.1, "model.decoder.lr": "${lr}"}
+    assert confr.select("model.*.lr", resolve=True) == {"model.encoder.lr": 0.1, "model.decoder.lr": 0.5}
+    assert confr.select("model.encoder.*") == {"model.encoder.lr": 0.1, "model.encoder.layers": [1, 2]}
+    assert confr.select("**.lr") == {"lr": 0.5, "model.encoder.lr": 0.1, "model.decoder.lr": "${lr}"}
+
+    with confr.modified_conf(**{"model.encoder.lr": 0.3}):
+        assert confr.select("model.encoder.lr") == {"model.encoder.lr": 0.3}
+
+
+def test_write_conf_resolved():
+    with TemporaryDirectory() as tmp_dir:
+        conf = {
+            "num": 3,
+            "name": "${k1.k2}",
+            "k1": {"k2": "v2", "k3": "${.k2}", "k4": "${encoder}"},
+            "encoder": {
+                "_callable": "@confr.test.imports.get_encoder()",
+                "num": "${num}",
+            },
+            "secret": "s3cr3t",
+        }
+        confr.init(conf=conf, cli_overrides=False)
+        conf_fn = os.path.join(tmp_dir, "compiled.yaml")
+        confr.write_conf(conf_fn, except_keys=["secret"], resolved=True)
+
+        compiled = read_yaml(conf_fn)
+        assert compiled["conf"] == {
+            "num": 3,
+            "name": "v2",
+            "k1": {"k2": "v2", "k3": "v2", "k4": "${encoder}"}, # singletons aren't copied
+            "encoder": {
+                "_callable": "@confr.test.imports.get_encoder()",
+                "num": 3,
+            },
+        }, compiled["conf"]
+        assert compiled["_compiled"]["types"]["num"] == "int"
+        fingerprints = compiled["_compiled"]["fingerprints"]
+        assert fingerprints["name"] == fingerprints["k1.k2"] == fingerprints["k1.k3"]
+        assert "encoder" in fingerprints and "secret" not in fingerprints
+
+        # the fingerprints only depend on the resolved values
+        confr.init(conf={**conf, "name": "v2", "k1": {"k2": "v2", "k3": "v2", "k4": "${encoder}"}}, cli_overrides=False)
+        conf_fn2 = os.path.join(tmp_dir, "compiled2.yaml")
+        confr.write_conf(conf_fn2, except_keys=["secret"], resolved=True)
+        assert read_yaml(conf_fn2)["_compiled"]["fingerprint"] == compiled["_compiled"]["fingerprint"]
+
+        confr.init(compiled=conf_fn, cli_overrides=False)
+        assert confr.get("name") == "v2"
+        assert confr.get("k1.k4").num == confr.get("encoder").num == 3
+        assert confr.get_type("num") == int
+        confr.compiled.verify_compiled(compiled)
+
+
+def test_write_conf_binary(monkeypatch):
+    with TemporaryDirectory() as tmp_dir:
+        conf = {
+            "num": 3,
+            "classes": {0: "cat", 1: "dog"},
+            "model": {"name": "${k1.k2}", "layers": [1, 2, 3]},
+            "k1": {"k2": "v2"},
+            "encoder": {
+                "_callable": "@confr.test.imports.get_encoder()",
+                "num": "${num}",
+            },
+        }
+        confr.init(conf=conf, cli_overrides=False)
+        conf_fn = os.path.join(tmp_dir, "compiled.confrb")
+        confr.write_conf(conf_fn, binary=True)
+
+        confr.init(compiled=conf_fn, cli_overrides=False, env_overrides=False)
+        lazy_keys = confr.get_global_conf().c_lazy.keys
+        assert set(lazy_keys()) == {"num", "classes", "model", "k1", "encoder"}
+        assert confr.get_type("model.layers") == list
+
+        assert confr.get("model.layers") == [1, 2, 3]
+        assert set(lazy_keys()) == {"num", "classes", "k1", "encoder"}
+        assert confr.get("encoder").num == 3
+        assert confr.get("classes")[0] == "cat"
+        confr.set("k1.k3", "v3")
+        assert set(lazy_keys()) == {"num"}
+
+        assert confr.to_dict() == {
+            "num": 3,
+            "classes": {0: "cat", 1: "dog"},
+            "model": {"name": "v2", "layers": [1, 2, 3]},
+            "k1": {"k2": "v2", "k3": "v3"},
+            "encoder": {
+                "_callable": "@confr.test.imports.get_encoder()",
+                "num": 3,
+            },
+        }
+        assert not lazy_keys()
+
+        confr.compiled.read_compiled(conf_fn, verify=True)
+
+        monkeypatch.setattr(sys, "version_info", (3, 99)) # read by another Python version
+        with pytest.raises(Exception, match="written with marshal version"):
+            confr.compiled.BinaryCompiled(conf_fn, verbose=False)
+
+
+def test_lazy_file_refs():
+    with TemporaryDirectory() as conf_dir:
+        write_yaml(
+            os.path.join(conf_dir, f"{confr.settings.BASE_CONF}.yaml"),
+            {
+                "conf_key": 123,
+                "vocab": {"_file": "vocab"},
+                "neural_net": {"_file": "refs.yaml"},
+            },
+        )
+        write_yaml(os.path.join(conf_dir, "vocab.yaml"), {"words": ["a", "b"]})
+        write_yaml(os.path.join(conf_dir, "refs.yaml"), {"k1": {"_file": "v1.yaml"}, "k5": "${conf_key}"})
+        write_yaml(os.path.join(conf_dir, "v1.yaml"), {"k2": "v2", "k3": {"k4": 4}})
+        write_yaml(os.path.join(conf_dir, "v1_types.yaml"), {"k2": "str", "k3": {"k4": "int"}})
+
+        confr.init(conf_dir=conf_dir, lazy_file_refs=True, cli_overrides=False)
+        lazy_keys = confr.get_global_conf().c_lazy.keys
+        assert set(lazy_keys()) == {"vocab", "neural_net"}
+
+        assert confr.get("neural_net.k5") == 123
+        assert set(lazy_keys()) == {"vocab", "neural_net.k1"}
+        assert confr.get("neural_net.k1.k3.k4") == 4
+        assert set(lazy_keys()) == {"vocab"}
+        assert confr.get_type("neural_net.k1.k3.k4") == int
+        assert confr.get_type("neural_net.k5") == str
+
+        assert confr.to_dict() == {
+            "conf_key": 123,
+            "vocab": {"words": ["a", "b"]},
+            "neural_net": {"k1": {"k2": "v2", "k3": {"k4": 4}}, "k5": "${conf_key}"},
+        }
+        assert not lazy_keys()
+
+        write_yaml(os.path.join(conf_dir, "v1_types.yaml"), {"k3": {"k4": "str"}})
+        confr.init(conf_dir=conf_dir, lazy_file_refs=True, cli_overrides=False)
+        with pytest.raises(AssertionError):
+            confr.get("neural_net.k1")
+
+
+def test_startup_profile(capsys):
+    confr.init(conf={"key1": "val1"}, cli_overrides=False, profile=True)
+    assert confr.interface.global_conf.profile.report() in capsys.readouterr().out # logged
+    timings = confr.startup_profile()
+    assert set(timings) == {"import", "parse", "merge", "refs", "types", "cli", "env", "plx"}
+    assert timings["import"] > 0
+    assert timings["cli"] == 0 # disabled
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, confr; "
+        "confr.init(conf={'k': 'v'}, cli_overrides=False, verbose=False); "
+        "print(sorted(m for m in ['yaml', 'argparse', 'inspect', 'concurrent.futures', 'logging'] if m in sys.modules))"
+    )
+    out = subprocess.check_output([sys.executable, "-c", code]).decode("utf-8")
+    assert out.strip() == "[]", out
+
+
+def test_update():
+    conf = {
+        "key1": "val1",
+        "k1": {"k2": 2, "k3": 3},
+        "num": 3,
+        "encoder": {
+            "_callable": "@confr.test.imports.get_encoder()",
+            "num": "${num}",
+        },
+        "unrelated": "@confr.test.imports.MySimpleClass()",
+    }
+    confr.init(conf=conf, cli_overrides=False)
+    encoder, unrelated = confr.get("encoder"), confr.get("unrelated")
+    assert encoder.num == 3
+
+    confr.update({"key1": "val2", "k1": {"k2": 4}, "k4.k5": "v5"})
+    assert fn1() == "val2"
+    assert confr.to_dict()["k1"] == {"k2": 4, "k3": 3}
+    assert confr.get("k4.k5") == "v5"
+    assert confr.get("encoder") is encoder # doesn't depend on the updated keys
+
+    confr.update({"num": 5})
+    assert confr.get("encoder") is not encoder
+    assert confr.get("encoder").num == 5
+    assert confr.get("unrelated") is unrelated
+
+    confr.set("num", 6)
+    assert confr.get("encoder").num == 6
+
+
+def test_update_atomic():
+    confr.init(conf={"key1": "val1", "k1": {"k2": 2, "k3": 3}}, types={"k1": {"k2": int}}, cli_overrides=False)
+    d = confr.to_dict()
+
+    with pytest.raises(AssertionError):
+        confr.update({"key1": "val2", "k1": {"k2": "not an int", "k4": 4}, "k5.k6": "v6"})
+    assert confr.to_dict() == d
+    assert "k5" not in confr.select("*")
+
+    def validate():
+        assert confr.get("key1") != "invalid"
+
+    with pytest.raises(AssertionError):
+        confr.update({"k1.k3": 4, "key1": "invalid"}, validate=validate)
+    assert confr.to_dict() == d
+
+    with pytest.raises(AssertionError):
+        confr.update({"k1.k2": "not an int"}, atomic=False)
+    assert confr.get("k1.k2") == "not an int"
+
+
+def test_diff():
+    conf_a = {
+        "threshold": 0.5,
+        "num": 3,
+        "removed": "v",
+        "lst": [1, 2],
+        "encoder": {
+            "_callable": "@confr.test.imports.get_encoder()",
+            "num": "${num}",
+        },
+        "unrelated": "@confr.test.imports.MySimpleClass()",
+    }
+    conf_b = deepcopy(conf_a)
+    conf_b["threshold"] = 0.7
+    conf_b["lst"] = [1, 2, 3]
+    conf_b["added"] = {"k": "v"}
+    del conf_b["removed"]
+
+    with TemporaryDirectory() as conf_dir:
+        fp = os.path.join(conf_dir, "new.yaml")
+        write_yaml(fp, conf_b, verbose=False)
+        changes = confr.diff(conf_a, fp)
+    assert sorted(changes) == sorted([
+        confr.Change("threshold", "changed", 0.5, 0.7),
+        confr.Change("lst", "changed", [1, 2], [1, 2, 3]),
+        confr.Change("added.k", "added", None, "v"),
+        confr.Change("removed", "removed", "v", None),
+    ])
+    assert confr.diff(conf_a, deepcopy(conf_a)) == []
+
+    confr.init(conf=conf_a, cli_overrides=False)
+    encoder, unrelated = confr.get("encoder"), confr.get("unrelated")
+    confr.apply_diff(changes)
+    assert confr.to_dict() == conf_b
+    assert confr.get("encoder") is encoder
+    assert confr.get("unrelated") is unrelated
+
+    confr.apply_diff(confr.diff(confr.get_global_conf(), {**conf_b, "num": 4}))
+    assert confr.get("encoder") is not encoder
+    assert confr.get("encoder").num == 4
+    assert confr.get("unrelated") is unrelated
+
+
+def test_modified_conf_singletons():
+    conf = {
+        "num": 3,
+        "encoder": {
+            "_callable": "@confr.test.imports.get_encoder()",
+            "num": "${num}",
+        },
+        "model": {
+            "_callable": "@confr.test.imports.MyClass()",
+            "num": "${encoder}",
+        },
+        "unrelated": "@confr.test.imports.MySimpleClass()",
+    }
+    confr.init(conf=conf, cli_overrides=False)
+    encoder, model, unrelated = confr.get("encoder"), confr.get("model"), confr.get("unrelated")
+
+    modified = []
+    for _ in range(2):
+        with confr.modified_conf(num=4):
+            assert confr.get("encoder").num == 4
+            assert confr.get("model").num is confr.get("encoder")
+            assert confr.get("unrelated") is unrelated
+            modified.append((confr.get("encoder"), confr.get("model")))
+    assert modified[0][0] is modified[1][0] and modified[0][1] is modified[1][1] # created once
+    assert confr.get("encoder") is encoder and confr.get("model") is model
+
+    with confr.modified_conf(**{"encoder.num": 5}):
+        assert confr.get("encoder").num == 5
+        assert confr.get("model").num.num == 5
+    with confr.modified_conf(encoder={"_callable": "@confr.test.imports.get_encoder()", "num": 6}):
+        assert confr.get("encoder").num == 6
+    assert confr.get("encoder") is encoder and encoder.num == 3
+
+    confr.set("num", 4) # the base singletons are recreated, rather than reusing the modified ones
+    assert confr.get("encoder").num == 4
+    assert confr.get("encoder") is not modified[0][0]
+
+
+def test_set_list_read_with_get():
+    confr.init(conf={"a": [1, [2, 3], {"k": [4]}]}, cli_overrides=False)
+    confr.set("b", confr.get("a"))
+    c_original = confr.get_global_conf().c_original
+    assert type(c_original["b"]) == list and type(c_original["b"][2]) == dict
+    assert type(c_original["b"][2]["k"]) == list
+    with TemporaryDirectory() as tmp_dir:
+        fp = os.path.join(tmp_dir, "conf.yaml")
+        confr.write_conf(fp)
+        assert read_yaml(fp)["b"] == [1, [2, 3], {"k": [4]}]
+
+
+def test_set_dict_read_with_get():
+    confr.init(conf={"a": 1, "model": {"x": 1, "y": "${a}", "sub": {"z": 2}}}, cli_overrides=False)
+    confr.set("m2", confr.get("model"))
+    confr.set("m3", {"inner": confr.get("model.sub")})
+    assert type(confr.get_global_conf().c_original["m2"]) == dict
+    assert confr.get("m2.x") == 1 and confr.get("m2.y") == 1 and confr.get("m3.inner.z") == 2
+    assert confr.to_dict()["m2"] == {"x": 1, "y": "${a}", "sub": {"z": 2}}
+    with TemporaryDirectory() as tmp_dir:
+        fp = os.path.join(tmp_dir, "conf.yaml")
+        confr.write_conf(fp)
+        assert read_yaml(fp)["m3"] == {"inner": {"z": 2}}
+
+
+def test_modified_conf_singletons_sweep():
+    conf = {"encoder": {"_callable": "@confr.test.imports.get_encoder()"}, "num": 3}
+    confr.init(conf=conf, cli_overrides=False)
+
+    encoders = {}
+    for num in [5, 6, 7, 5]: # get_encoder reads num with confr.bind
+        with confr.modified_conf(num=num):
+            encoder = confr.get("encoder")
+            assert encoder.num == num
+            assert encoders.setdefault(num, encoder) is encoder # one per distinct value
+    assert len(encoders) == 3
+    with confr.modified_conf(**{"encoder.num": 8}):
+        assert confr.get("encoder").num == 8
+    assert confr.get("encoder").num == 3
+
+
+def test_list_resolution():
+    conf = {
+        "lst": [1, "@confr.test.imports.my_fn", [2, 3], {"k": "v"}],
+        "objs": ["@confr.test.imports.MySimpleClass()"],
+    }
+    confr.init(conf=conf, cli_overrides=False)
+
+    from confr.test.imports import my_fn
+    lst = confr.get("lst")
+    assert lst == [1, my_fn, [2, 3], {"k": "v"}]
+    assert confr.get("lst") is lst # resolved once
+    with pytest.raises(TypeError):
+        lst.append(4)
+    with pytest.raises(TypeError):
+        lst[2][0] = 4
+    with pytest.raises(TypeError):
+        lst[3]["k"] = "v2"
+    assert deepcopy(lst[:3]) == [1, my_fn, [2, 3]]
+    assert list(lst) + [4] == [1, my_fn, [2, 3], {"k": "v"}, 4]
+
+    confr.set("lst", [5])
+    assert confr.get("lst") == [5]
+    with confr.modified_conf(lst=[6]):
+        assert confr.get("lst") == [6]
+    assert confr.get("lst") == [5]
+
+    # lists which create objects are resolved on every access
+    assert confr.get("objs")[0] is not confr.get("objs")[0]
+
+    # read-only lists and the dicts in them can be copied, pickled and serialized
+    confr.init(conf={"lst": [1, [2, 3], {"k": ["v"]}]}, cli_overrides=False)
+    lst = confr.get("lst")
+    for copied in [deepcopy(lst), pickle.loads(pickle.dumps(lst))]:
+        assert copied == [1, [2, 3], {"k": ["v"]}]
+        with pytest.raises(TypeError):
+            copied[2]["k"] = "v2"
+    assert json.dumps(lst) == '[1, [2, 3], {"k": ["v"]}]'
+    assert yaml.safe_load(yaml.safe_dump(lst)) == [1, [2, 3], {"k": ["v"]}]
+
+
+def test_dict_views():
+    conf = {
+        "lr": 0.1,
+        "model": {
+            "lr": "${lr}",
+            "encoder": {"_callable": "@confr.test.imports.MySimpleClass()"},
+            "decoder": {"layers": [1, 2], "lr": "${..lr}"},
+        },
+    }
+    confr.init(conf=conf, cli_overrides=False)
+
+    model = confr.get("model")
+    assert confr.get("model") is model
+    assert model["lr"] == 0.1 and model["decoder"]["lr"] == 0.1
+    assert "encoder" in model and "encoder" not in confr.get_global_conf().c_singletons # not resolved yet
+    assert model["encoder"] is confr.get("model.encoder")
+    assert model["decoder"] == {"layers": [1, 2], "lr": 0.1}
+    with pytest.raises(TypeError):
+        model["lr"] = 0.2
+
+    confr.set("model.decoder.layers", [3])
+    assert confr.get("model") is not model
+    assert confr.get("model")["decoder"]["layers"] == [3]
+
+    with confr.modified_conf(lr=0.3):
+        modified = confr.get("model")
+        assert modified["lr"] == 0.3
+    assert modified["decoder"]["lr"] == 0.3 # resolved with the overrides active when it was created
+    assert confr.get("model")["decoder"].to_dict() == {"layers": [3], "lr": 0.1}
+
+    decoder = confr.get("model")["decoder"]
+    assert deepcopy(decoder) == pickle.loads(pickle.dumps(decoder)) == {"layers": [3], "lr": 0.1}
+    assert type(deepcopy(decoder)) == dict
+
+    with confr.modified_conf(model={"lr": 1.0}): # overrides the whole dict
+        assert confr.get("model")["lr"] == 1.0
+    with confr.modified_conf(**{"model.decoder.lr": 2.0}):
+        assert confr.get("model")["decoder"]["lr"] == 2.0
+
+
+def test_bind_cache(monkeypatch):
+    @confr.bind
+    def fn(a=confr.value, b=confr.value("k.b"), c=3):
+        return a, b, c
+
+    assert confr.bound_callables[f"{__name__}.test_bind_cache.<locals>.fn"] is fn
+
+    confr.init(conf={"a": 1, "k": {"b": 2}}, cli_overrides=False)
+    keys_read = []
+    get = Conf.get
+    monkeypatch.setattr(Conf, "get", lambda self, k, default=None: keys_read.append(k) or get(self, k, default))
+
+    assert fn() == (1, 2, 3)
+    assert fn() == (1, 2, 3)
+    assert fn(5) == (5, 2, 3)
+    assert fn(b=6) == (1, 6, 3)
+    assert keys_read == ["a", "k.b"] # resolved once
+
+    confr.set("unrelated", 1)
+    assert fn() == (1, 2, 3)
+    assert keys_read == ["a", "k.b"]
+
+    confr.set("a", 4)
+    assert fn() == (4, 2, 3)
+    with confr.modified_conf(a=7):
+        assert fn() == (7, 2, 3)
+    assert fn() == (4, 2, 3)
+
+    confr.init(conf={"a": 8, "k": {"b": 9}}, cli_overrides=False)
+    assert fn() == (8, 9, 3)
+
+
+def test_bind_cache_singletons():
+    conf = {
+        "enc1": {"_callable": "@confr.test.imports.get_encoder()"},
+        "enc2": {"_callable": "@confr.test.imports.get_encoder()"},
+        "num": 3,
+    }
+    confr.init(conf=conf, cli_overrides=False)
+    assert confr.get("enc1").num == 3 and confr.get("enc2").num == 3
+    confr.set("num", 7) # enc2 was created with the cached kwargs of get_encoder
+    assert confr.get("enc1").num == 7 and confr.get("enc2").num == 7
+    confr.release("enc2")
+    assert confr.get("enc2").num == 7
+    confr.update({"num": 8})
+    assert confr.get("enc1").num == 8 and confr.get("enc2").num == 8
+
+    @confr.bind
+    def fn(enc1=confr.value):
+        return enc1
+
+    confr.init(conf=conf, cli_overrides=False, singleton_max_items=1)
+    ref = weakref.ref(fn())
+    confr.get("enc2") # evicts enc1
+    gc.collect()
+    assert ref() is None # not kept alive by fn's cached kwargs
+    assert fn().num == 3
+
+
+def test_on_change():
+    confr.init(conf={"a": 1, "b": {"c": 2, "d": "${e}"}, "e": 3, "f": 4}, cli_overrides=False)
+    calls = []
+    cancel = confr.on_change("b", calls.append)
+    try:
+        generation = confr.generation("b")
+        confr.set("a", 2)
+        confr.set("f", 5)
+        assert calls == [] and confr.generation("b") == generation
+        assert confr.generation() > generation
+
+        confr.set("b.c", 3)
+        confr.update({"e": 4, "b.c": 4, "f": 6}) # one batch
+        assert calls == [["b.c"], ["e", "b.c"]]
+        assert confr.generation("b") > generation and confr.generation("b.d") == generation
+
+        calls.clear()
+        before = confr.generation("e")
+        with confr.modified_conf(e=5, a=3):
+            inside = confr.generation("e")
+        assert calls == [["e"], ["e"]]
+        assert before < inside < confr.generation("e")
+
+        calls.clear()
+        before = confr.generation("b")
+        confr.init(conf={"a": 1, "b": {"c": 4, "d": "${e}"}, "e": 5}, cli_overrides=False)
+        assert calls == [["e"]]
+        assert confr.generation("b") > before and confr.generation() > before
+    finally:
+        cancel()
+    confr.set("b.c", 5)
+    assert calls == [["e"]]
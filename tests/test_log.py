@@ -0,0 +1,43 @@
+import os
+import logging
+from tempfile import TemporaryDirectory
+
+import confr
+from confr import log
+from confr.utils import write_yaml
+
+
+def test_messages(capsys):
+    confr.init(conf={"k1": "v1", "k2": {"k3": 3}}, cli_overrides=False)
+    confr.set("k2", {"k3": 4})
+    out = capsys.readouterr().out
+    assert "Declaring config." in out or "Redeclaring config." in out
+    assert 'Override k2 = {\n    "k3": 4\n}' in out
+
+    log.configure(level=logging.WARNING)
+    try:
+        confr.init(conf={"k1": "v1"}, cli_overrides=False)
+        confr.set("k1", "v2")
+        assert capsys.readouterr().out == ""
+    finally:
+        log.configure(level=logging.INFO)
+
+
+def test_events():
+    events = []
+    confr.add_event_handler(events.append)
+    try:
+        with TemporaryDirectory() as conf_dir:
+            fp = os.path.join(conf_dir, "_base.yaml")
+            write_yaml(fp, {"k1": "v1", "k2": 2}, verbose=False)
+            confr.init(conf_dir=conf_dir, cli_overrides=False, verbose=False)
+            confr.set("k1", "v2")
+            confr.set("k2", 2) # unchanged, no event
+    finally:
+        confr.remove_event_handler(events.append)
+
+    assert {"event": "write", "fp": fp} in events
+    assert {"event": "load", "fp": fp} in events
+    assert {"event": "init", "redeclared": True} in events
+    overrides = [e for e in events if e["event"] == "override"]
+    assert overrides == [{"event": "override", "key": "k1", "value": "v2", "former_value": "v1"}]
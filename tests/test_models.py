@@ -1,6 +1,9 @@
+import os
 from copy import deepcopy
+from tempfile import TemporaryDirectory
+import pytest
 import confr
-from confr.models import _in, _get, _set, _is_interpolation, _interpolated_key, _deep_merge_dicts
+from confr.models import Conf, _in, _get, _set, _is_interpolation, _interpolated_key, _deep_merge_dicts, _decode_override
 
 
 # Mock fns
@@ -394,6 +397,22 @@ def test_deep_merge_dicts_with_missing_subkeys():
     }, ret
 
 
+def test_conf_dict_not_aliased():
+    conf_dict = {"model": {"layers": [1, 2], "encoder": {"dim": 8}}}
+    overrides = {"model": {"encoder": {"dim": 16}}}
+    conf = Conf(conf=conf_dict, overrides=overrides, verbose=False, cli_overrides=False, env_overrides=False)
+    conf.set("model.encoder.dim", 32)
+    conf.to_dict()["model"]["encoder"]["dim"] = 64
+    assert conf_dict == {"model": {"layers": [1, 2], "encoder": {"dim": 8}}}
+    assert overrides == {"model": {"encoder": {"dim": 16}}}
+    assert conf.get("model.encoder.dim") == 32
+
+    layers = [4]
+    conf.set("model.layers", layers)
+    layers.append(5)
+    assert list(conf.get("model.layers")) == [4]
+
+
 def test_singleton_dict():
     conf = {
         "some_dict": "@confr.test.imports.get_dict()",
@@ -402,3 +421,176 @@ def test_singleton_dict():
     confr.init(conf=conf, cli_overrides=False)
 
     assert confr.get("some_dict") == confr.get("some_dict") == {1: 1, 2: "@something()"}
+
+
+def test_decode_override():
+    assert _decode_override("123") == 123
+    assert _decode_override("123", str) == "123"
+    assert _decode_override("1", float) == 1.0 and type(_decode_override("1", float)) == float
+    assert _decode_override("1e-3", float) == 0.001
+    assert _decode_override("true", bool) is True
+    assert _decode_override("null") is None
+    assert _decode_override("[1, 2]", list) == [1, 2]
+    assert _decode_override("[a, b]", list) == ["a", "b"]
+    assert _decode_override('{"k": {"k2": 1}}') == {"k": {"k2": 1}}
+    assert _decode_override("{k: v}") == {"k": "v"}
+    assert _decode_override("yes") == "yes"
+    assert _decode_override("[unclosed") == "[unclosed"
+
+
+def test_env_overrides(monkeypatch):
+    conf = {
+        "name": "default",
+        "num": 1,
+        "lr": 0.1,
+        "layers": [1],
+        "model": {"size": 2, "id": "007"},
+    }
+    monkeypatch.setenv("CONFR_name", "123")
+    monkeypatch.setenv("CONFR_num", "5")
+    monkeypatch.setenv("CONFR_lr", "1")
+    monkeypatch.setenv("CONFR_layers", "[1, 2, 3]")
+    monkeypatch.setenv("CONFR_model__size", "4")
+    monkeypatch.setenv("CONFR_model__id", "008")
+    monkeypatch.setenv("CONFR_model__extra", '{"k": [1, "a"]}')
+    monkeypatch.setenv("CONFR_new", "false")
+
+    c = Conf(conf=deepcopy(conf), types={"model": {"id": str}}, cli_overrides=False)
+    assert c.to_dict() == {
+        "name": "123",
+        "num": 5,
+        "lr": 1.0,
+        "layers": [1, 2, 3],
+        "model": {"size": 4, "id": "008", "extra": {"k": [1, "a"]}},
+        "new": False,
+    }
+    assert c.types["lr"] == float
+
+
+def test_singleton_cache():
+    conf = {
+        "num": 3,
+        "encoder": {
+            "_callable": "@confr.test.imports.MyClass()",
+            "_cache": True,
+            "num": "${num}",
+        },
+        "uncached": {
+            "_callable": "@confr.test.imports.MyClass()",
+            "num": 1,
+        },
+    }
+    events = []
+    confr.add_event_handler(events.append)
+    try:
+        with TemporaryDirectory() as cache_dir:
+            def make_conf(conf):
+                return Conf(conf=conf, cli_overrides=False, verbose=False, singleton_cache_dir=cache_dir)
+
+            c1 = make_conf(conf)
+            assert c1.get("encoder").num == 3
+            assert c1.get("uncached").num == 1
+
+            c2 = make_conf(conf) # e.g. in another process
+            encoder = c2.get("encoder")
+            assert encoder.num == 3 and encoder is not c1.get("encoder")
+
+            c2.set("num", 4) # the cache key depends on interpolated values
+            assert c2.get("encoder").num == 4
+            c3 = make_conf({**conf, "num": 4})
+            assert c3.get("encoder").num == 4
+    finally:
+        confr.remove_event_handler(events.append)
+
+    hits = [e["hit"] for e in events if e["event"] == "singleton_cache"]
+    assert hits == [False, True, False, True]
+
+
+def test_singleton_cache_bound_inputs():
+    # get_encoder reads num with confr.value, rather than as an argument in the definition
+    conf = {"encoder": {"_callable": "@confr.test.imports.get_encoder()", "_cache": True}, "num": 3}
+    events = []
+    confr.add_event_handler(events.append)
+    try:
+        with TemporaryDirectory() as cache_dir:
+            def init(conf):
+                confr.init(conf=conf, cli_overrides=False, verbose=False, singleton_cache_dir=cache_dir)
+
+            init(conf)
+            assert confr.get("encoder").num == 3
+            confr.set("num", 4)
+            assert confr.get("encoder").num == 4
+            init({**conf, "num": 9})
+            assert confr.get("encoder").num == 9
+            init(conf)
+            assert confr.get("encoder").num == 3 # cached
+            init(conf)
+            with confr.modified_conf(**{"encoder.num": 5}):
+                assert confr.get("encoder").num == 5
+    finally:
+        confr.remove_event_handler(events.append)
+
+    hits = [e["hit"] for e in events if e["event"] == "singleton_cache"]
+    assert hits == [False, False, False, True, False]
+
+
+def test_concurrent_init(tmp_path):
+    files = {
+        "_base.yaml": "lr: 0.1\nmodel:\n  _file: model\n",
+        "_base_types.yaml": "lr: float\n",
+        "model.yaml": "layers: 2\nencoder:\n  _file: encoder\n",
+        "model_types.yaml": "layers: int\n",
+        "encoder.json": '{"dim": 8}',
+        "p1.yaml": "lr: 0.2\nbatch_size: 4\n",
+        "p2.json": '{"lr": 0.3}',
+    }
+    for fn, s in files.items():
+        (tmp_path / fn).write_text(s)
+
+    kwargs = dict(conf_dir=str(tmp_path), conf_patches=["p1", "p2"], verbose=False, cli_overrides=False, env_overrides=False)
+    events = []
+    confr.add_event_handler(events.append)
+    try:
+        c = Conf(**kwargs)
+    finally:
+        confr.remove_event_handler(events.append)
+    sequential = Conf(concurrent_init=False, **kwargs)
+
+    assert c.to_dict() == sequential.to_dict() == {
+        "lr": 0.3, "batch_size": 4, "model": {"layers": 2, "encoder": {"dim": 8}},
+    }
+    assert c.types == sequential.types
+    # files are reported in the order they're merged, however they're read
+    assert [os.path.basename(e["fp"]) for e in events if e["event"] == "load"] == [
+        "_base.yaml", "_base_types.yaml", "p1.yaml", "p2.json", "model.yaml", "encoder.json", "model_types.yaml",
+    ]
+    assert set(c.profile.stages) == {
+        f"read {tmp_path}/{name}" for name in ["_base", "p1", "p2", "model", "encoder"]
+    } | {f"types {tmp_path}/{fn}" for fn in ["model.yaml", "encoder.json"]}
+
+    with pytest.raises(FileNotFoundError):
+        Conf(**{**kwargs, "conf_patches": ["p1", "missing"]})
+
+
+def test_pipeline_threads():
+    import threading
+    from confr.pipeline import Pipeline
+    from confr.profiling import StartupProfile
+
+    pipeline = Pipeline(StartupProfile())
+    started, release = threading.Semaphore(0), threading.Event()
+
+    def read(i):
+        started.release()
+        release.wait()
+        return i
+
+    threads_before = threading.active_count()
+    for i in range(100):
+        pipeline.start(f"read {i}", read, i)
+    for _ in range(8):
+        started.acquire()
+    assert threading.active_count() - threads_before == 8 # a pool, not a thread per stage
+    release.set()
+    assert [pipeline.result(f"read {i}", read, i) for i in range(100)] == list(range(100))
+    pipeline.clear()
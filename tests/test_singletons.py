@@ -0,0 +1,78 @@
+import gc
+
+import confr
+from confr.singletons import SingletonStore, sizeof
+
+
+class Obj:
+    def __init__(self, size=0):
+        self.data = b"x" * size
+
+
+def test_store_lru():
+    store = SingletonStore(max_items=2)
+    a, b, c = Obj(), Obj(), Obj()
+    store.set("a", a)
+    store.set("b", b)
+    assert store.get("a") is a # b is now the least recently used
+    store.set("c", c)
+    assert "a" in store and "b" not in store and "c" in store
+    assert store.to_dict() == {"a": a, "c": c}
+
+
+def test_store_max_bytes():
+    store = SingletonStore(max_bytes=15000)
+    store.set("a", Obj(10000))
+    store.set("b", Obj(10000))
+    assert "a" not in store and "b" in store
+    store.set("c", Obj(100000)) # bigger than max_bytes on its own, but kept as the last one set
+    assert list(store.memory()) == ["c"]
+    assert store.memory()["c"] >= 100000
+
+
+def test_store_weak_keys():
+    store = SingletonStore(weak_keys=["model"])
+    model, enc, other = Obj(), Obj(), Obj()
+    store.set("model", model)
+    store.set("model.enc", enc)
+    store.set("other", other)
+    store.set("model.num", 3) # can't be weakly referenced
+    del model, enc, other
+    gc.collect()
+    assert "model" not in store and "model.enc" not in store
+    assert "other" in store and store.get("model.num") == 3
+
+
+def test_release():
+    conf = {
+        "model": {
+            "enc": "@confr.test.imports.MySimpleClass()",
+            "dec": "@confr.test.imports.MySimpleClass()",
+        },
+        "other": "@confr.test.imports.MySimpleClass()",
+    }
+    confr.init(conf=conf, cli_overrides=False)
+    enc, dec, other = confr.get("model.enc"), confr.get("model.dec"), confr.get("other")
+    assert set(confr.singleton_memory()) == {"model.enc", "model.dec", "other"}
+    assert confr.singleton_memory()["other"] == sizeof(other)
+
+    confr.release("model")
+    assert list(confr.singleton_memory()) == ["other"]
+    assert confr.get("model.enc") is not enc and confr.get("model.dec") is not dec
+    assert confr.get("other") is other
+
+
+def test_override_singletons_bounded():
+    conf = {"enc": {"_callable": "@confr.test.imports.get_encoder()"}, "num": 0}
+    confr.init(conf=conf, cli_overrides=False, override_singleton_max_items=4)
+    conf = confr.interface.global_conf
+    for i in range(1, 100):
+        with confr.modified_conf(num=i):
+            assert confr.get("enc").num == i
+    assert len(conf.c_override_singletons) == 4
+    assert set(conf.c_override_deps) == set(conf.c_override_singletons.entries)
+
+    with confr.modified_conf(num=99): # still stored
+        enc = confr.get("enc")
+    with confr.modified_conf(num=99):
+        assert confr.get("enc") is enc
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from confr import sources
+from confr.models import Conf
+from confr.sources import HTTPSource
+
+
+class Server(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.files = {} # path -> contents
+        self.missing_status = 404 # status of requests for paths which aren't in files
+        self.requests = [] # (path, status)
+        self.clients = set() # client (host, port), i.e. one per connection
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        data = self.server.files.get(self.path)
+        if data is None:
+            status, headers, data = self.server.missing_status, {}, b""
+        else:
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+            headers = {"ETag": etag}
+            if self.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+            else:
+                status = 200
+        self.server.requests.append((self.path, status))
+
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _conf(conf_dir):
+    return Conf(conf_dir=conf_dir, verbose=False, cli_overrides=False, env_overrides=False)
+
+
+def test_http_source(server, tmp_path, monkeypatch):
+    source = HTTPSource(cache_dir=str(tmp_path))
+    monkeypatch.setitem(sources.sources, "http", source)
+    server.files = {
+        "/conf/_base.yaml": b"a: 1\nmodel:\n  _file: model\ndata:\n  _file: data.yaml\n",
+        "/conf/model.yaml": b"layers: 3\nencoder:\n  _file: encoder\n",
+        "/conf/data.yaml": b"path: /data\n",
+        "/conf/encoder.yaml": b"dim: 16\n",
+        "/conf/model_types.yaml": b"layers: int\n",
+    }
+
+    conf = _conf(f"{server.url}/conf")
+    assert conf.get("a") == 1
+    assert conf.get("model.layers") == 3
+    assert conf.get("model.encoder.dim") == 16
+    assert conf.get("data.path") == "/data"
+    assert conf.types["model"]["layers"] == int
+    fetched = {path for path, status in server.requests if status == 200}
+    assert fetched == set(server.files)
+    # connections are reused, despite the concurrent fetches
+    assert len(server.clients) < len(server.requests)
+
+    # unchanged files are revalidated with a conditional request
+    server.requests.clear()
+    server.files["/conf/data.yaml"] = b"path: /data2\n"
+    conf = _conf(f"{server.url}/conf")
+    assert conf.get("model.encoder.dim") == 16
+    assert conf.get("data.path") == "/data2"
+    statuses = dict(server.requests)
+    assert statuses["/conf/data.yaml"] == 200
+    assert statuses["/conf/model.yaml"] == statuses["/conf/encoder.yaml"] == 304
+
+    # and not at all while they're fresh
+    monkeypatch.setitem(sources.sources, "http", HTTPSource(cache_dir=str(tmp_path), max_age=60))
+    _conf(f"{server.url}/conf") # revalidates once more, storing the max age
+    server.requests.clear()
+    assert _conf(f"{server.url}/conf").get("data.path") == "/data2"
+    assert [status for path, status in server.requests if status != 404] == []
+
+
+@pytest.mark.parametrize("missing_status", [403, 410])
+def test_http_source_missing(server, tmp_path, monkeypatch, missing_status):
+    monkeypatch.setitem(sources.sources, "http", HTTPSource(cache_dir=str(tmp_path)))
+    server.files = {"/conf/_base.yaml": b"a: 1\n"}
+    server.missing_status = missing_status # e.g. S3 without list permissions responds with 403
+    assert _conf(f"{server.url}/conf").get("a") == 1 # _base_types.yaml doesn't exist
+    assert missing_status in dict(server.requests).values()
+
+
+def test_join():
+    assert sources.join("http://host/conf", "model.yaml") == "http://host/conf/model.yaml"
+    assert sources.join("http://host/conf/", "sub/model.yaml") == "http://host/conf/sub/model.yaml"
+    assert sources.join("config", "http://host/model.yaml") == "http://host/model.yaml"
+    assert sources.join("config", "model.yaml") == "config/model.yaml"
@@ -1,5 +1,11 @@
+import array
+import os
 from copy import deepcopy
-from confr.utils import recursive_merge
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from confr.utils import recursive_merge, read_yaml, write_yaml, copy_tree, intern_keys, deep_merge
 from confr.test.imports import MyClass
 
 
@@ -82,3 +88,97 @@ def test_recursive_merge_inputs_unchanged():
         c_singletons2["k1"]["k2"]["encoder"].num
     assert active_conf["k1"]["k2"]["encoder"].num == 20, \
         active_conf["k1"]["k2"]["encoder"].num
+
+
+def test_deep_merge():
+    src = {"k1": {"k2": [1, 2], "k3": {"k4": "v4"}}, "k5=": {"k6": "v6"}, "k7": {"k8": None}}
+    dst = {"k1": {"k2": [0], "k9": "v9"}, "k5": {"k10": "v10"}, "k7": "v7"}
+    src_orig = deepcopy(src)
+    assert deep_merge(src, dst) is dst
+    assert dst == {
+        "k1": {"k2": [1, 2], "k9": "v9", "k3": {"k4": "v4"}},
+        "k5": {"k6": "v6"}, # replaced, not merged
+        "k7": {"k8": None},
+    }
+
+    dst["k1"]["k2"].append(3)
+    dst["k1"]["k3"]["k4"] = "changed"
+    dst["k5"]["k6"] = "changed"
+    assert src == src_orig # dst doesn't alias src
+
+    deep_src, deep_dst = {}, {}
+    node = deep_src
+    for _ in range(5000): # deeper than the recursion limit
+        node["k"] = {}
+        node = node["k"]
+    node["leaf"] = 1
+    deep_merge(deep_src, deep_dst)
+    node = deep_dst
+    for _ in range(5000):
+        node = node["k"]
+    assert node == {"leaf": 1}
+
+
+def test_copy_tree():
+    arr = array.array("f", [1.0, 2.0])
+    d = {"k1": {"k2": [1, {"k3": "v3"}], "arr": arr}, "k4": None}
+    d_copy = copy_tree(d)
+    assert d_copy == d
+    assert d_copy["k1"]["k2"][1] is not d["k1"]["k2"][1]
+    assert d_copy["k1"]["arr"] is not arr
+
+    deep = {}
+    node = deep
+    for _ in range(5000): # deeper than the recursion limit
+        node["k"] = {}
+        node = node["k"]
+    node = copy_tree(deep)
+    depth = 0
+    while node:
+        node = node["k"]
+        depth += 1
+    assert depth == 5000
+
+
+def test_intern_keys():
+    d = intern_keys({"".join(["na", "me"]): {"".join(["na", "me"]): 1}, "k": [{"".join(["na", "me"]): 2}]})
+    keys = [next(iter(d)), next(iter(d["name"])), next(iter(d["k"][0]))]
+    assert keys[0] is keys[1] is keys[2]
+    assert d == {"name": {"name": 1}, "k": [{"name": 2}]}
+
+
+def test_write_yaml_except_keys():
+    d = {"k1": "v1", "k2": {"k3": "v3", "k4": {"k5": [1, 2]}}}
+    d_orig = deepcopy(d)
+    with TemporaryDirectory() as tmp_dir:
+        fp = os.path.join(tmp_dir, "conf.yaml")
+        write_yaml(fp, d, except_keys=["k1", "k2.k4.k5"])
+        assert read_yaml(fp) == {"k2": {"k3": "v3", "k4": {}}}
+        assert d == d_orig
+
+
+def test_write_yaml_atomic():
+    with TemporaryDirectory() as tmp_dir:
+        fp = os.path.join(tmp_dir, "conf.yaml")
+        write_yaml(fp, {"k1": "v1"})
+
+        with pytest.raises(Exception):
+            write_yaml(fp, {"k1": "v2", "k2": MyClass(num=1)}) # not serializable
+
+        assert read_yaml(fp) == {"k1": "v1"}
+        assert os.listdir(tmp_dir) == ["conf.yaml"]
+
+
+def test_write_yaml_file_mode():
+    with TemporaryDirectory() as tmp_dir:
+        fp = os.path.join(tmp_dir, "conf.yaml")
+        umask = os.umask(0o022)
+        try:
+            write_yaml(fp, {"k1": "v1"})
+        finally:
+            os.umask(umask)
+        assert os.stat(fp).st_mode & 0o777 == 0o644 # as if created with open, not mkstemp's 0o600
+
+        os.chmod(fp, 0o640)
+        write_yaml(fp, {"k1": "v2"})
+        assert os.stat(fp).st_mode & 0o777 == 0o640
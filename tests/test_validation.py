@@ -1,10 +1,11 @@
 import os
+import threading
 from tempfile import TemporaryDirectory
 
 import pytest
 
 import confr
-from confr.test import validations
+from confr.test import validations, registered_validations
 from confr.utils import write_yaml
 
 
@@ -269,3 +270,63 @@ def test_validate_and_set_missing_types():
             "k3": {"k4": float},
         }
         confr.init(conf=conf, types=types, cli_overrides=False)
+
+
+def test_validator_registry():
+    registered_validations.calls.clear()
+    confr.init(conf={"batch_size": 32, "lr": 0.1}, validate=registered_validations, cli_overrides=False)
+    assert sorted(registered_validations.calls) == ["helper", "validate_batch_size", "validate_lr"]
+
+    with pytest.raises(AssertionError):
+        confr.init(conf={"batch_size": 32, "lr": 2.0}, validate=registered_validations, cli_overrides=False)
+
+
+def test_validator_cache():
+    with TemporaryDirectory() as tmp_dir:
+        cache_fp = os.path.join(tmp_dir, "validations.json")
+
+        registered_validations.calls.clear()
+        conf = {"batch_size": 32, "lr": 0.1}
+        confr.init(conf=conf, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+        assert sorted(registered_validations.calls) == ["helper", "validate_batch_size", "validate_lr"]
+
+        registered_validations.calls.clear()
+        confr.init(conf=conf, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+        assert registered_validations.calls == []
+
+        registered_validations.calls.clear()
+        conf = {"batch_size": 32, "lr": 0.2}
+        confr.init(conf=conf, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+        assert registered_validations.calls == ["validate_lr"]
+
+        # failed validations are not cached
+        registered_validations.calls.clear()
+        conf = {"batch_size": 32, "lr": 2.0}
+        for _ in range(2):
+            with pytest.raises(AssertionError):
+                confr.init(conf=conf, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+        assert registered_validations.calls == ["validate_lr", "validate_lr"]
+        assert os.listdir(tmp_dir) == ["validations.json"] # written atomically, no temp files left
+
+
+def test_validator_cache_interpolations():
+    with TemporaryDirectory() as tmp_dir:
+        cache_fp = os.path.join(tmp_dir, "validations.json")
+        conf = {"batch_size": 32, "base_lr": 0.1, "lr": "${base_lr}"}
+        confr.init(conf=conf, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+
+        registered_validations.calls.clear()
+        with pytest.raises(AssertionError): # lr resolves to the changed base_lr
+            confr.init(conf={**conf, "base_lr": 5.0}, validate=registered_validations, validate_cache=cache_fp, cli_overrides=False)
+        assert registered_validations.calls == ["validate_lr"]
+
+
+def test_validator_workers():
+    threads = []
+    validators = [lambda: threads.append(threading.get_ident()) for _ in range(4)]
+    confr.init(conf={"k": 1}, validate=validators, cli_overrides=False)
+    assert threads == [threading.get_ident()] * 4 # sequential unless validate_workers is set
+
+    threads.clear()
+    confr.init(conf={"k": 1}, validate=validators, validate_workers=2, cli_overrides=False)
+    assert len(threads) == 4 and threading.get_ident() not in threads